@@ -0,0 +1,118 @@
+"""
+Micro-benchmark of the /my_info renderer.
+
+Compares the previous renderer (ZoneInfo/datetime.now()/fromisoformat per line, string concatenation) with
+render_my_info() and with the memoised my_info_from_user_id() over subscribers with large jira_status lists.
+
+    python benchmarks/bench_my_info.py [--users 50] [--worklogs 2000] [--repeat 5]
+"""
+import argparse, calendar, random, timeit
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from common import load_bot
+
+bot = load_bot()
+
+def legacy_render_my_info(s: dict) -> str:
+    """The renderer as it was before render_my_info(), kept verbatim (minus the file read) as the baseline"""
+    msg = ""
+    msg += f"⏱️ Daily Log for: {datetime.now(ZoneInfo(timezone := s.get('timezone', 'UTC'))).strftime('%Y-%m-%d, %a')}:\n"
+    for k, v in s['log'].items():
+        msg += f"  {bot.action_to_icon[k.lower()]} {k.upper().replace('IN', ' IN').replace('OUT', ' OUT')} (/{k.lower()}) - <code>{datetime.fromisoformat(v).astimezone(ZoneInfo(timezone)).strftime('%H:%M:%S')}</code>\n" if v and datetime.fromisoformat(v).astimezone(ZoneInfo(timezone)).strftime('%Y-%m-%d') == datetime.now(ZoneInfo(timezone)).strftime('%Y-%m-%d') else f"  {bot.action_to_icon[k.lower()]} {k.upper().replace('IN', ' IN').replace('OUT', ' OUT')} (/{k.lower()}) -\n"
+    msg += f"\n📅 Weekly schedule [/set_daily_schedule]:\n"
+    msg += "[week_day,day_in,lunch_out,day_out]\n"
+    for i, v in enumerate(s.get('weekly_schedule', ['N/A']*7)):
+        msg += f"<code>{v}</code> [{calendar.day_abbr[i]}]\n" if v else f"N/A [{calendar.day_abbr[i]}]\n"
+    msg += f"\n🌍 Timezone: <code>{timezone}</code>\nUse /set_timezone to update\n"
+    if stop_until_str := s.get('pause_reminders'):
+        stop_until = datetime.fromisoformat(stop_until_str).astimezone(ZoneInfo(timezone))
+        now = datetime.now(ZoneInfo(timezone))
+        if now < stop_until:
+            msg += f"\n⏸️ Reminders paused until: <code>{stop_until.strftime('%Y-%m-%d %H:%M')}</code>\nUse /resume_reminders to resume immediately\n"
+        else:
+            msg += f"\n✅ Reminders active (/pause_reminders)\n"
+    else:
+        msg += f"\n✅ Reminders active (/pause_reminders)\n"
+    if t := s.get('bamboo_phpsessid'):
+        msg += f"\n🔐 Bamboo HR PHPSESSID:\n<code>{t[:5]}**{t[-5:]}</code>\nUse /unset_bamboo_phpsessid to unset\nUse /set_bamboo_phpsessid to update\n"
+        msg += f"\nBamboo HR Log:\n"
+        if err := s.get('bamboo_status', {}).get('error'):
+            msg += f" ❗{err}\n"
+        for log in s.get('bamboo_status', {}).get('clockEntries', []):
+            msg += f"  {log.get('start').split(' ')[1]} -> {log.get('end').split(' ')[1] if log.get('end') else 'now'}, {bot.date_diff_in_hhmm(log.get('start'), log.get('end') or datetime.now(ZoneInfo(timezone)).strftime('%Y-%m-%d %H:%M:%S'))}\n"
+    else:
+        msg += f"\n🔐 Bamboo HR PHPSESSID: N/A\nuse /set_bamboo_phpsessid to set\n"
+    if j := s.get('jira_credentials'):
+        jemail, jtoken = j.split(',')
+        jtoken = f"{jtoken[:5]}**{jtoken[-5:]}"
+        j = f"{jemail},{jtoken}"
+        msg += f"\n🐞 Jira Credentials:\n<code>{j}</code>\nUse /unset_jira_credentials to unset\nUse /set_jira_credentials to update\nUse /add_jira_worklog to add Jira worklog.\n"
+        msg += f"\n🐞 Worklog for today (/add_jira_worklog):\n"
+        total_time_spent_seconds_today = 0
+        for jira_status in s.get('jira_status') or []:
+            if datetime.fromisoformat(jira_status['date']).astimezone(ZoneInfo(timezone)).strftime('%Y-%m-%d') == datetime.now(ZoneInfo(timezone)).strftime('%Y-%m-%d'):
+                msg += f"    <code>{jira_status['issue_key']}</code> [{jira_status['time_spent']}]: {jira_status['comment']} [<i>{datetime.fromisoformat(jira_status['date']).astimezone(ZoneInfo(timezone)).strftime('%H:%M')}</i>]\n"
+                total_time_spent_seconds_today += jira_status['time_spent_seconds']
+        msg += f"\n    Total time logged today: <b>{bot.jira_seconds_to_workdays(total_time_spent_seconds_today)}</b>\n"
+    else:
+        msg += f"\n🐞 Jira credentials: N/A\nuse /set_jira_credentials to set\n"
+    msg += f"\nℹ️ Use /my_info to show your info."
+    return msg.strip()
+
+def synthetic_subscriber(user_id: int, worklogs: int) -> dict:
+    tz = random.choice(['UTC', 'Asia/Dubai', 'Europe/Warsaw', 'America/New_York', 'Asia/Tokyo'])
+    now = datetime.now(ZoneInfo(tz))
+    return {
+        'id': user_id,
+        'timezone': tz,
+        'log': {
+            'dayin': (now - timedelta(hours=3)).astimezone(timezone.utc).isoformat(),
+            'lunchout': "2000-01-01T13:00:00+00:00",
+            'lunchin': "2000-01-01T14:00:00+00:00",
+            'dayout': "2000-01-01T20:30:00+00:00",
+        },
+        'weekly_schedule': [f"{d},09:00,13:00,18:00" if d <= 5 else "N/A" for d in range(1, 8)],
+        'bamboo_phpsessid': 'mThcCZD2N5wGtGkCsCNb1h6YIt7ML3lW',
+        'bamboo_status': {'employeeId': user_id, 'clockEntries': [
+            {'start': now.strftime('%Y-%m-%d 09:00:00'), 'end': now.strftime('%Y-%m-%d 13:00:00')},
+            {'start': now.strftime('%Y-%m-%d 14:00:00'), 'end': None},
+        ]},
+        'jira_credentials': 'someone@example.com,ATATT3xFfGF0abcdefghijklmnop',
+        'jira_status': sorted(({
+            'worklog_id': str(user_id * 100000 + i),
+            'issue_key': f"KC-{random.randint(1, 999)}",
+            'time_spent': '30m',
+            'time_spent_seconds': 1800,
+            'comment': f"Worked on feature {i}",
+            'date': (now - timedelta(minutes=random.randint(0, 3 * 24 * 60))).isoformat(),
+        } for i in range(worklogs)), key=lambda x: x['date'], reverse=True),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--worklogs', type=int, default=2000, help='jira_status entries per user')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(1)
+    users = [synthetic_subscriber(user_id, args.worklogs) for user_id in range(1, args.users + 1)]
+    for s in users:
+        bot.save_subscriber(s)
+        assert legacy_render_my_info(s) == bot.render_my_info(s), f"renderers disagree for user {s['id']}"
+
+    results = {
+        'legacy renderer': lambda: [legacy_render_my_info(s) for s in users],
+        'render_my_info()': lambda: [bot.render_my_info(s) for s in users],
+        'my_info_from_user_id() (memoised)': lambda: [bot.my_info_from_user_id(s['id']) for s in users],
+    }
+    print(f"{args.users} users x {args.worklogs} jira_status entries, best of {args.repeat}")
+    baseline = None
+    for name, fn in results.items():
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat)) / len(users)
+        baseline = baseline or best
+        print(f"  {name:<36} {best * 1000:9.3f} ms/render  x{baseline / best:,.1f}")
+
+if __name__ == '__main__':
+    main()
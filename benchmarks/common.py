@@ -0,0 +1,18 @@
+"""Shared helpers of the benchmarks: load the bot module from kc-checkin-bot.py inside a scratch working directory."""
+import importlib.util, os, sys, tempfile
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'kc-checkin-bot.py')
+
+def load_bot(workdir: str | None = None, **env):
+    """
+    Import kc-checkin-bot.py as the module `kcbot`. The bot creates logs/ and subscribers/ in the working directory,
+    so it is imported from `workdir` (a new temporary directory by default). `env` overrides environment variables.
+    """
+    os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+    os.environ.update({k: str(v) for k, v in env.items()})
+    os.chdir(workdir or tempfile.mkdtemp(prefix='kc-checkin-bot-bench-'))
+    spec = importlib.util.spec_from_file_location('kcbot', BOT_PATH)
+    bot = importlib.util.module_from_spec(spec)
+    sys.modules['kcbot'] = bot
+    spec.loader.exec_module(bot)
+    return bot
@@ -0,0 +1,206 @@
+"""
+Local stand-ins for Bamboo HR, the Jira REST API and the Telegram Bot API, used by the load tests.
+
+Every fake is an aiohttp server in its own process, so neither its latency nor its CPU time is charged to the bot.
+Requests are answered after `latency` seconds (+-50% jitter), `error_rate` of them fail, and requests and injected
+errors are counted per route; stats() fetches the counters from the fake's /__stats__ endpoint.
+"""
+import asyncio, base64, json, multiprocessing, random, re, time, urllib.request
+from collections import Counter
+
+from aiohttp import web
+
+class FakeService:
+    name = 'service'
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self.requests: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._process: multiprocessing.Process | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def routes(self, app: web.Application):
+        raise NotImplementedError
+
+    def route_name(self, request: web.Request) -> str:
+        return request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+
+    def error_response(self) -> web.Response:
+        return web.json_response({'error': 'injected failure'}, status=503)
+
+    def counters(self) -> dict:
+        return {'requests': self.requests, 'errors': self.errors}
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        if request.path == '/__stats__':
+            return web.json_response(self.counters())
+        route = self.route_name(request)
+        self.requests[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors[route] += 1
+            return self.error_response()
+        return await handler(request)
+
+    def start(self) -> 'FakeService':
+        parent, child = multiprocessing.Pipe()
+        self._process = multiprocessing.get_context('spawn').Process(target=self._serve, args=(child,), name=f"fake-{self.name}", daemon=True)
+        self._process.start()
+        self.port = parent.recv()
+        return self
+
+    def _serve(self, conn):
+        async def serve():
+            app = web.Application(middlewares=[self._middleware])
+            self.routes(app)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, self.host, self.port).start()
+            conn.send(runner.addresses[0][1])
+            await asyncio.Event().wait()
+        asyncio.run(serve())
+
+    def stats(self) -> dict:
+        with urllib.request.urlopen(f"{self.url}/__stats__") as r:
+            return json.load(r)
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(10)
+
+class FakeBamboo(FakeService):
+    """/widget/timeTracking, /home (CSRF token) and /timesheet/clock/{in|out}/{employee_id}; PHPSESSIDs in `expired` get the login page"""
+    name = 'bamboo'
+    csrf_token = 'ab' * 64
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expired: set[str] = set()
+
+    def session(self, request: web.Request) -> str | None:
+        if (m := re.search(r'PHPSESSID=([^;]+)', request.headers.get('Cookie', ''))) and m.group(1) not in self.expired:
+            return m.group(1)
+        return None
+
+    def routes(self, app: web.Application):
+        login = web.Response(text='<html><body>Log in to BambooHR</body></html>', content_type='text/html')
+        async def time_tracking(request):
+            if not (phpsessid := self.session(request)):
+                return login
+            now = time.localtime()
+            return web.json_response({'employeeId': sum(map(ord, phpsessid)), 'clockEntries': [
+                {'start': time.strftime('%Y-%m-%d 09:00:00', now), 'end': time.strftime('%Y-%m-%d 13:00:00', now)},
+                {'start': time.strftime('%Y-%m-%d 14:00:00', now), 'end': None},
+            ]})
+        async def home(request):
+            if not self.session(request):
+                return login
+            return web.Response(text=f'<script>var CSRF_TOKEN = "{self.csrf_token}";</script>', content_type='text/html')
+        async def clock(request):
+            if not self.session(request) or request.headers.get('x-csrf-token') != self.csrf_token:
+                return web.json_response({'error': 'csrf'}, status=403)
+            return web.json_response({'ok': True})
+        app.router.add_get('/widget/timeTracking', time_tracking)
+        app.router.add_get('/home', home)
+        app.router.add_post('/timesheet/clock/{in_out}/{employee_id}', clock)
+
+class FakeJira(FakeService):
+    """
+    The REST endpoints the worklog sync uses. Every account (basic auth email) owns `worklogs_per_user` worklogs spread
+    over a few issues, all updated when the fake started, so the first sync fetches them and later syncs only search.
+    """
+    name = 'jira'
+
+    def __init__(self, *args, worklogs_per_user: int = 5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.worklogs_per_user = worklogs_per_user
+        self.updated_at = time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime())
+
+    def error_response(self) -> web.Response:
+        return web.json_response({'errorMessages': ['injected failure']}, status=503)
+
+    def account(self, request: web.Request) -> str:
+        auth = request.headers.get('Authorization', '')
+        return base64.b64decode(auth.removeprefix('Basic ')).decode().split(':')[0] if auth.startswith('Basic ') else 'anonymous'
+
+    def worklog_ids(self, email: str) -> list[int]:
+        base = (sum(map(ord, email)) * 7919 % 100000) * 1000
+        return [base + i for i in range(self.worklogs_per_user)]
+
+    @staticmethod
+    def issue_id(worklog_id: int) -> int:
+        return 10000 + worklog_id % 50
+
+    def routes(self, app: web.Application):
+        async def server_info(request):
+            return web.json_response({'version': '1001.0.0', 'versionNumbers': [1001, 0, 0], 'deploymentType': 'Cloud', 'baseUrl': self.url})
+        async def search(request):
+            # worklogAuthor = currentUser(): the issues the account logged work on
+            ids = sorted({self.issue_id(i) for i in self.worklog_ids(self.account(request))})
+            return web.json_response({'issues': [{'id': str(i), 'key': f'KC-{i}', 'fields': {'updated': self.updated_at}} for i in ids],
+                                      'total': len(ids), 'startAt': 0, 'maxResults': len(ids), 'isLast': True})
+        async def worklogs(request):
+            email, issue_id = self.account(request), int(request.match_info['issue'])
+            started = time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime())
+            values = [{'id': str(i), 'issueId': str(issue_id), 'author': {'emailAddress': email}, 'timeSpent': '30m', 'timeSpentSeconds': 1800,
+                       'comment': f'Worklog {i}', 'started': started} for i in self.worklog_ids(email) if self.issue_id(i) == issue_id]
+            return web.json_response({'startAt': 0, 'maxResults': len(values), 'total': len(values), 'worklogs': values})
+        app.router.add_get('/rest/api/2/serverInfo', server_info)
+        app.router.add_route('*', '/rest/api/2/search', search)
+        app.router.add_route('*', '/rest/api/2/search/jql', search)
+        app.router.add_get('/rest/api/2/issue/{issue}/worklog', worklogs)
+        # a non-empty field list, the client refetches an empty one before every search
+        app.router.add_get('/rest/api/2/field', lambda request: web.json_response([{'id': 'updated', 'name': 'Updated', 'clauseNames': ['updated']}]))
+        app.router.add_get('/rest/api/2/myself', lambda request: web.json_response({'accountId': 'fake', 'emailAddress': self.account(request)}))
+
+class FakeTelegram(FakeService):
+    """
+    Bot API methods the bot calls, served under /bot{token}/{method} (point the bot at it with TELEGRAM_API_URL).
+    Injected errors are 429 flood-control answers with `retry_after`.
+    """
+    name = 'telegram'
+
+    def __init__(self, *args, retry_after: int = 1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+        self.message_ids = iter(range(1, 1 << 62))
+        self.sent_at: list[tuple[int, float]] = []  # (chat_id, time.time()) of every sendMessage/editMessageText
+
+    def counters(self) -> dict:
+        return {**super().counters(), 'sent_at': self.sent_at}
+
+    def route_name(self, request: web.Request) -> str:
+        return request.match_info.get('method', request.path)
+
+    def error_response(self) -> web.Response:
+        return web.json_response({'ok': False, 'error_code': 429, 'description': f'Too Many Requests: retry after {self.retry_after}',
+                                  'parameters': {'retry_after': self.retry_after}}, status=429)
+
+    def routes(self, app: web.Application):
+        me = {'id': 123456, 'is_bot': True, 'first_name': 'KC Check-in Bot', 'username': 'kc_checkin_bot'}
+        async def method(request):
+            params = dict(await request.post()) if request.can_read_body else {}
+            name = request.match_info['method'].lower()
+            if name in ('sendmessage', 'editmessagetext'):
+                chat_id = int(params.get('chat_id', 0))
+                self.sent_at.append((chat_id, time.time()))
+                result = {'message_id': int(params.get('message_id') or next(self.message_ids)), 'date': int(time.time()),
+                          'chat': {'id': chat_id, 'type': 'private'}, 'from': me, 'text': params.get('text', '')}
+            elif name == 'getme':
+                result = me
+            elif name == 'getupdates':
+                result = []
+            else:
+                result = True
+            return web.json_response({'ok': True, 'result': result})
+        app.router.add_post('/bot{token}/{method}', method)
@@ -0,0 +1,202 @@
+"""
+Load test of the bot against local Bamboo HR, Jira and Telegram fakes (benchmarks/fakes.py).
+
+Scenarios:
+    sweep     reminder evaluation and a full Bamboo HR/Jira refresh pass over --users synthetic subscribers/*.json
+    burst     --users subscribers whose Day IN reminder is due in the same minute (the 09:00 burst)
+    my_info   --users concurrent /my_info commands fed through the dispatcher
+    all       sweep with 1k and 10k users, burst and my_info, each in its own process
+
+Reports wall times, p50/p99 latencies and the requests each fake received.
+
+    python benchmarks/load_test.py sweep --users 1000 [--latency 0.05] [--error-rate 0.01]
+    python benchmarks/load_test.py all
+"""
+import argparse, asyncio, json, os, random, statistics, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+
+from common import load_bot
+from fakes import FakeBamboo, FakeJira, FakeTelegram
+
+def percentiles(samples: list[float]) -> dict:
+    if len(samples) < 2:
+        return {'p50': samples[0] if samples else None, 'p99': samples[0] if samples else None}
+    q = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50': q[49], 'p99': q[98]}
+
+def synthetic_subscriber(user_id: int, schedule: list[str] | None = None, integrations: bool = True) -> dict:
+    s = {
+        'id': user_id,
+        'username': f'user{user_id}',
+        'first_name': f'User {user_id}',
+        'timezone': random.choice(['UTC', 'Asia/Dubai', 'Europe/Warsaw', 'America/New_York', 'Asia/Tokyo']),
+        'log': {'dayin': "2000-01-01T09:00:00+00:00", 'lunchout': "2000-01-01T13:00:00+00:00", 'lunchin': "2000-01-01T14:00:00+00:00", 'dayout': "2000-01-01T20:30:00+00:00"},
+        'weekly_schedule': schedule or [f"{d},09:00,13:00,18:00" if d <= 5 else "N/A" for d in range(1, 8)],
+    }
+    if integrations:
+        s['bamboo_phpsessid'] = f'session{user_id:027d}'
+        s['jira_credentials'] = f'user{user_id}@example.com,ATATT{user_id:020d}'
+    return s
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.fakes = {
+            'bamboo': FakeBamboo(args.latency, args.error_rate).start(),
+            'jira': FakeJira(args.latency, args.error_rate).start(),
+            'telegram': FakeTelegram(args.telegram_latency, args.telegram_error_rate).start(),
+        }
+        self.bot = load_bot(
+            BAMBOO_BASE_URL=self.fakes['bamboo'].url,
+            JIRA_SERVER=self.fakes['jira'].url,
+            TELEGRAM_API_URL=self.fakes['telegram'].url,
+            SUBSCRIBER_STORE=args.store,
+            FSM_STORAGE='memory',
+            WORKER_MODE='all',
+            **({'TELEGRAM_GLOBAL_RATE': args.telegram_rate} if args.telegram_rate else {}),
+        )
+        self.report = {'scenario': args.scenario, 'users': args.users, 'store': args.store, 'latency': args.latency, 'error_rate': args.error_rate}
+
+    def add_subscribers(self, subscribers: list[dict]):
+        for s in subscribers:
+            self.bot.save_subscriber(s)
+        self.bot.subscribers.flush()
+        self.bot.subscribers._records.clear()  # start cold, like a fresh process
+
+    def requests(self) -> dict:
+        return {name: {'requests': stats['requests'], 'total': sum(stats['requests'].values()), 'errors': sum(stats['errors'].values())}
+                for name, stats in ((name, fake.stats()) for name, fake in self.fakes.items())}
+
+    async def sweep(self):
+        self.add_subscribers([synthetic_subscriber(user_id) for user_id in range(1, self.args.users + 1)])
+        started = time.perf_counter()
+        self.bot.reminders.rebalance()
+        self.report['reminder_evaluation_seconds'] = time.perf_counter() - started
+
+        semaphore, latencies = asyncio.Semaphore(self.bot.REMINDER_CONCURRENCY), []
+        async def refresh(user_id: int):
+            async with semaphore:
+                t = time.perf_counter()
+                try:
+                    await asyncio.wait_for(self.bot.refresh_subscriber(user_id), self.bot.REMINDER_USER_TIMEOUT)
+                finally:
+                    latencies.append(time.perf_counter() - t)
+        started = time.perf_counter()
+        await asyncio.gather(*(refresh(user_id) for user_id in self.bot.subscribers.ids()), return_exceptions=True)
+        self.report['refresh_sweep_seconds'] = time.perf_counter() - started
+        self.report['refresh_latency'] = percentiles(latencies)
+        started = time.perf_counter()
+        self.bot.subscribers.flush()
+        self.report['flush_seconds'] = time.perf_counter() - started
+
+    async def burst(self):
+        now = datetime.now(timezone.utc)
+        schedule = [f"{now.isoweekday()},{now:%H:%M},23:58,23:59" if d == now.isoweekday() else "N/A" for d in range(1, 8)]
+        self.add_subscribers([{**synthetic_subscriber(user_id, schedule, integrations=False), 'timezone': 'UTC'} for user_id in range(1, self.args.users + 1)])
+        telegram = self.fakes['telegram']
+        started = time.time()
+        task = asyncio.create_task(self.bot.reminders.run())
+        while True:
+            sent = (await asyncio.to_thread(telegram.stats))['sent_at']
+            if len({chat_id for chat_id, _ in sent}) >= self.args.users or time.time() - started > self.args.timeout:
+                break
+            await asyncio.sleep(0.2)
+        task.cancel()
+        first_sent = {}
+        for chat_id, sent_at in sent:
+            first_sent.setdefault(chat_id, sent_at - started)
+        self.report['reminders_sent'] = len(first_sent)
+        self.report['burst_seconds'] = max(first_sent.values(), default=None)
+        self.report['reminder_delay'] = percentiles(sorted(first_sent.values()))
+        self.report['outbound_wait'] = {priority: percentiles(list(waits.recent)) for priority, waits in self.bot.outbound.waits.items()}
+
+    async def my_info(self):
+        from aiogram.types import Update
+        self.add_subscribers([synthetic_subscriber(user_id) for user_id in range(1, self.args.users + 1)])
+        await self.bot.bot.me()  # the command filter needs the bot username, fetch it outside the measurement
+        def update(user_id: int) -> Update:
+            return Update.model_validate({'update_id': user_id, 'message': {
+                'message_id': user_id, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'},
+                'text': '/my_info', 'entities': [{'type': 'bot_command', 'offset': 0, 'length': 8}],
+            }}, context={'bot': self.bot.bot})
+        latencies = []
+        async def handle(user_id: int):
+            t = time.perf_counter()
+            await self.bot.dp.feed_update(self.bot.bot, update(user_id))
+            latencies.append(time.perf_counter() - t)
+        started = time.perf_counter()
+        await asyncio.gather(*(handle(user_id) for user_id in range(1, self.args.users + 1)))
+        self.report['storm_seconds'] = time.perf_counter() - started
+        self.report['handler_latency'] = percentiles(latencies)
+        started = time.perf_counter()
+        while self.bot.background_tasks or self.bot.refresh_tasks:
+            await asyncio.gather(*self.bot.background_tasks, *self.bot.refresh_tasks.values(), return_exceptions=True)
+        self.report['revalidation_seconds'] = time.perf_counter() - started
+
+    async def run(self) -> dict:
+        logging_level = self.bot.logger.level
+        self.bot.logger.setLevel('WARNING')
+        try:
+            await getattr(self, self.args.scenario)()
+        finally:
+            self.bot.logger.setLevel(logging_level)
+            await self.bot.bamboo.aclose()
+            await self.bot.bot.session.close()
+            self.bot.jira_executor.shutdown()
+        self.report['fakes'] = self.requests()
+        for fake in self.fakes.values():
+            fake.stop()
+        self.report['jira_executor'] = {**self.bot.jira_executor.stats, 'recent_wait': percentiles(list(self.bot.jira_executor.waits.recent))}
+        return self.report
+
+def print_report(report: dict):
+    print(f"\n== {report['scenario']}: {report['users']} users ({report['store']} store, {report['latency'] * 1000:.0f} ms latency, {report['error_rate']:.1%} errors)")
+    for key, value in report.items():
+        if key in ('scenario', 'users', 'store', 'latency', 'error_rate', 'fakes'):
+            continue
+        if isinstance(value, dict) and {'p50', 'p99'} <= value.keys():
+            value = ', '.join(f"{p} {v * 1000:.1f} ms" if v is not None else f"{p} -" for p, v in value.items())
+        elif isinstance(value, float):
+            value = f"{value:.3f} s" if key.endswith('seconds') else f"{value:.3f}"
+        print(f"  {key:<28} {value}")
+    for name, counts in report['fakes'].items():
+        print(f"  {name + ' requests':<28} {counts['total']} ({counts['errors']} injected errors) {counts['requests']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('scenario', choices=['sweep', 'burst', 'my_info', 'all'])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--store', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--latency', type=float, default=0.05, help='Bamboo HR/Jira response time in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of failing Bamboo HR/Jira requests')
+    parser.add_argument('--telegram-latency', type=float, default=0.02)
+    parser.add_argument('--telegram-error-rate', type=float, default=0.0, help='share of 429 answers')
+    parser.add_argument('--telegram-rate', type=float, help='override TELEGRAM_GLOBAL_RATE (messages/s)')
+    parser.add_argument('--timeout', type=float, default=600, help='give up on the burst after this many seconds')
+    parser.add_argument('--json', help='also write the report(s) to this file')
+    parser.add_argument('--quiet', action='store_true', help='do not print the report')
+    args = parser.parse_args()
+    random.seed(1)
+
+    if args.json:
+        args.json = os.path.abspath(args.json)  # load_bot() changes the working directory
+
+    if args.scenario == 'all':
+        reports = []
+        options = [f"--{k.replace('_', '-')}={v}" for k, v in vars(args).items() if k not in ('scenario', 'users', 'json', 'quiet') and v is not None]
+        for scenario, users in (('sweep', 1000), ('sweep', 10000), ('burst', 1000), ('my_info', 1000)):
+            with tempfile.NamedTemporaryFile(suffix='.json') as out:
+                subprocess.run([sys.executable, __file__, scenario, f'--users={users}', f'--json={out.name}', '--quiet', *options], check=True)
+                reports += json.load(open(out.name))
+    else:
+        reports = [asyncio.run(LoadTest(args).run())]
+    if not args.quiet:
+        for report in reports:
+            print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2, default=str)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Replay a stream of Telegram updates through the dispatcher with a stubbed Bot session, no network involved.
+
+Every update goes through dp.feed_update() one at a time; the report has per-handler throughput, a latency histogram
+and the I/O done per update: files opened for reading/writing (audit hook), subscriber store calls, FSM storage
+reads/writes and Bot API calls. Pending subscriber saves are flushed after each update so they count against it.
+
+    python benchmarks/replay.py [--users 100] [--updates 2000] [--record updates.jsonl]
+    python benchmarks/replay.py --replay updates.jsonl
+"""
+import argparse, asyncio, itertools, json, logging, os, random, statistics, sys, time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from common import load_bot
+from load_test import synthetic_subscriber
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, GetMe, SendMessage
+from aiogram.types import Message, Update, User
+
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250)
+
+class StubSession(BaseSession):
+    """Answers every Bot API method locally: sendMessage/editMessageText echo a Message, getMe the bot, the rest True"""
+    me = {'id': 123456, 'is_bot': True, 'first_name': 'KC Check-in Bot', 'username': 'kc_checkin_bot'}
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter[str] = Counter()
+        self.message_ids = itertools.count(1_000_000)
+
+    async def make_request(self, bot: Bot, method, timeout: int | None = None):
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, GetMe):
+            return User.model_validate(self.me, context={'bot': bot})
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return Message.model_validate({
+                'message_id': getattr(method, 'message_id', None) or next(self.message_ids), 'date': int(time.time()),
+                'chat': {'id': method.chat_id, 'type': 'private'}, 'from': self.me, 'text': method.text,
+            }, context={'bot': bot})
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+        yield
+
+    async def close(self):
+        pass
+
+class IOCounter:
+    """Counts file opens through an audit hook and wraps the subscriber store / FSM storage methods, only while active"""
+    def __init__(self, kc):
+        self.counts: Counter[str] = Counter()
+        self.active = False
+        sys.addaudithook(self._audit)
+        for name in ('load', 'save', 'delete', 'ids', 'ids_with_schedule', 'versions'):
+            self._wrap(kc.store, name, f'store_{name}')
+        if isinstance(kc.dp.storage, kc.SqliteFsmStorage):
+            self._wrap(kc.dp.storage, '_row', 'fsm_reads')
+            self._wrap(kc.dp.storage, '_write', 'fsm_writes')
+
+    def _wrap(self, obj, name: str, counter: str):
+        fn = getattr(obj, name)
+        def counted(*args, **kwargs):
+            if self.active:
+                self.counts[counter] += 1
+            return fn(*args, **kwargs)
+        setattr(obj, name, counted)
+
+    def _audit(self, event: str, args: tuple):
+        if not self.active:
+            return
+        if event == 'open' and isinstance(args[0], (str, bytes, os.PathLike)):
+            path, mode, flags = args
+            writes = any(c in mode for c in 'wax+') if mode else bool(flags & (os.O_WRONLY | os.O_RDWR))
+            self.counts['file_writes' if writes else 'file_reads'] += 1
+        elif event in ('os.listdir', 'os.scandir'):
+            self.counts['dir_scans'] += 1
+        elif event == 'os.rename':
+            self.counts['file_renames'] += 1
+        elif event == 'os.remove':
+            self.counts['file_removes'] += 1
+
+def generate_updates(users: int, count: int) -> list[dict]:
+    """Commands, inline button presses and multi-step FSM conversations of random subscribers, roughly in production mix"""
+    pause_until = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M')
+    conversations = [
+        (30, ['/my_info']), (15, ['/log']), (10, ['/dayin']), (10, ['action_lunchout']), (10, ['action_dayout']),
+        (5, ['/set_timezone', 'Europe/Warsaw']), (5, ['/set_daily_schedule', '1,09:00,13:00,18:00']),
+        (3, ['/pause_reminders', pause_until]), (3, ['/resume_reminders']), (3, ['/reset_day']),
+        (3, ['/start']), (3, ['/set_timezone', '/cancel']),
+    ]
+    weights, steps = zip(*conversations)
+    updates, update_ids = [], itertools.count(1)
+    while len(updates) < count:
+        user_id = random.randint(1, users)
+        for text in random.choices(steps, weights)[0]:
+            update_id = next(update_ids)
+            sender = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}'}
+            message = {'message_id': update_id, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'}, 'from': sender, 'text': text}
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+            if text.startswith('action_'):
+                updates.append({'update_id': update_id, 'callback_query': {'id': str(update_id), 'from': sender, 'chat_instance': str(user_id), 'data': text,
+                                                                          'message': {**message, 'from': StubSession.me, 'text': 'Reminder'}}})
+            else:
+                updates.append({'update_id': update_id, 'message': message})
+    return updates[:count]
+
+async def replay(kc, updates: list[dict]) -> dict:
+    bot = kc.bot = Bot(token=os.environ['BOT_TOKEN'], session=(session := StubSession()))
+    io = IOCounter(kc)
+    handled: dict[str, str] = {}
+    async def record_handler(handler, event, data):
+        handled['name'] = data['handler'].callback.__name__
+        return await handler(event, data)
+    kc.dp.message.middleware(record_handler)
+    kc.dp.callback_query.middleware(record_handler)
+    await bot.me()
+
+    stats = defaultdict(lambda: {'latencies': [], 'io': Counter()})
+    started = time.perf_counter()
+    for data in updates:
+        update = Update.model_validate(data, context={'bot': bot})
+        handled.clear()
+        session.calls.clear()
+        io.counts.clear()
+        io.active = True
+        t = time.perf_counter()
+        await kc.dp.feed_update(bot, update)
+        latency = time.perf_counter() - t
+        # background work the update started (e.g. /my_info revalidation) and its deferred saves belong to it
+        while kc.background_tasks or kc.refresh_tasks:
+            await asyncio.gather(*kc.background_tasks, *kc.refresh_tasks.values(), return_exceptions=True)
+        kc.subscribers.flush()
+        io.active = False
+        entry = stats[handled.get('name', 'unhandled')]
+        entry['latencies'].append(latency)
+        entry['io'].update(io.counts)
+        entry['io'].update({f'api_{name}': n for name, n in session.calls.items()})
+    total = time.perf_counter() - started
+    return {'updates': len(updates), 'seconds': total, 'handlers': stats}
+
+def print_report(report: dict):
+    print(f"{report['updates']} updates in {report['seconds']:.2f}s ({report['updates'] / report['seconds']:.0f} updates/s incl. flushes)\n")
+    print(f"  {'handler':<42} {'count':>6} {'upd/s':>8} {'p50 ms':>8} {'p99 ms':>8}  I/O per update")
+    for name, entry in sorted(report['handlers'].items(), key=lambda item: -sum(item[1]['latencies'])):
+        latencies, n = entry['latencies'], len(entry['latencies'])
+        q = statistics.quantiles(latencies, n=100, method='inclusive') if n > 1 else [latencies[0]] * 99
+        io = ', '.join(f"{k} {v / n:.2g}" for k, v in sorted(entry['io'].items()))
+        print(f"  {name:<42} {n:>6} {n / sum(latencies):>8.0f} {q[49] * 1000:>8.2f} {q[98] * 1000:>8.2f}  {io}")
+    print(f"\n  latency histogram (ms): {' '.join(f'<{b}' for b in BUCKETS_MS)} >={BUCKETS_MS[-1]}")
+    for name, entry in sorted(report['handlers'].items()):
+        histogram = Counter(next((i for i, b in enumerate(BUCKETS_MS) if latency * 1000 < b), len(BUCKETS_MS)) for latency in entry['latencies'])
+        print(f"  {name:<42} {' '.join(str(histogram.get(i, 0)) for i in range(len(BUCKETS_MS) + 1))}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100, help='synthetic subscribers the generated updates come from')
+    parser.add_argument('--updates', type=int, default=2000, help='number of generated updates')
+    parser.add_argument('--replay', help='JSONL file of recorded Update objects to replay instead of generating')
+    parser.add_argument('--record', help='write the generated updates to this JSONL file')
+    parser.add_argument('--store', choices=['json', 'sqlite'], default='json')
+    args = parser.parse_args()
+    random.seed(1)
+    for path in ('replay', 'record'):
+        if getattr(args, path):
+            setattr(args, path, os.path.abspath(getattr(args, path)))  # load_bot() changes the working directory
+
+    # unroutable integrations: a recorded /set_bamboo_phpsessid must not reach the real services
+    kc = load_bot(SUBSCRIBER_STORE=args.store, BAMBOO_BASE_URL='http://127.0.0.1:9', JIRA_SERVER='http://127.0.0.1:9', WORKER_MODE='all')
+    kc.logger.setLevel('WARNING')
+    logging.getLogger('aiogram.event').setLevel('WARNING')
+    if args.replay:
+        updates = [json.loads(line) for line in open(args.replay) if line.strip()]
+        users = {u.get('message', u.get('callback_query', {})).get('from', {}).get('id') for u in updates} - {None}
+    else:
+        updates, users = generate_updates(args.users, args.updates), range(1, args.users + 1)
+    if args.record:
+        with open(args.record, 'w') as f:
+            f.writelines(json.dumps(u) + '\n' for u in updates)
+    for user_id in users:
+        kc.save_subscriber(synthetic_subscriber(user_id, integrations=False))
+    kc.subscribers.flush()
+    print_report(asyncio.run(replay(kc, updates)))
+
+if __name__ == '__main__':
+    main()
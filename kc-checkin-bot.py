@@ -1,16 +1,44 @@
-import os, dotenv, requests, re, traceback
+import os, dotenv, httpx, re, traceback
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 from zoneinfo import ZoneInfo
-dotenv.load_dotenv(override=True)
+dotenv.load_dotenv()  # variables set on the process/container (e.g. WORKER_MODE per compose service) win over .env
 from textwrap import dedent
 
-from jira import JIRA
+from jira import JIRA, JIRAError
 
-from aiogram.exceptions import TelegramForbiddenError
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest, TelegramRetryAfter
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
 from logging import Logger
 import logging.config, atexit
 
 logger:Logger = logging.getLogger('kc-checkin-bot')
+
+class RedactSecrets(logging.Filter):
+    """Masks PHPSESSIDs, Jira API tokens and auth headers in every log record, including tracebacks and subscriber dumps"""
+    patterns = [
+        (re.compile(r"(PHPSESSID=)[^;\s'\"]+"), r'\1***'),
+        (re.compile(r"('(?:bamboo_phpsessid|jira_credentials)': )'[^']*'"), r"\1'***'"),
+        (re.compile(r'\b(Basic|Bearer) [A-Za-z0-9+/=._-]+'), r'\1 ***'),
+        (re.compile(r'\bATATT[A-Za-z0-9_=-]+'), 'ATATT***'),
+    ]
+
+    @classmethod
+    def redact(cls, text: str) -> str:
+        for pattern, replacement in cls.patterns:
+            text = pattern.sub(replacement, text)
+        return text
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg, record.args = self.redact(record.getMessage()), ()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.redact(logging.Formatter().formatException(record.exc_info))
+        return True
+
 os.makedirs('logs', exist_ok=True)
 logging.config.dictConfig({
     "version": 1,
@@ -21,6 +49,11 @@ logging.config.dictConfig({
             "datefmt": "%Y-%m-%dT%H:%M:%S%z"
         }
     },
+    "filters": {
+        "redact_secrets": {
+            "()": RedactSecrets
+        }
+    },
     "handlers": {
         "file": {
             "class": "logging.handlers.RotatingFileHandler",
@@ -40,12 +73,16 @@ logging.config.dictConfig({
             "class": "logging.handlers.QueueHandler",
             "handlers": ["file", "stdout"],
             "respect_handler_level": True,
+            "filters": ["redact_secrets"],
         }
     },
     "loggers": {
         "root": {
             "handlers": ["queue_handler"],
             "level": "DEBUG"
+        },
+        "httpx": {
+            "level": "WARNING"
         }
     }
 })
@@ -53,17 +90,23 @@ if queueHandler := logging.getHandlerByName('queue_handler'):
     queueHandler.listener.start()
     atexit.register(queueHandler.listener.stop)
 
-import asyncio, json
+import asyncio, json, time, heapq, sqlite3, threading, sys, weakref, hashlib, contextvars, itertools, signal, bisect, contextlib, copy, fcntl
 from datetime import datetime, timezone, timedelta
 
-from aiogram import Bot, Dispatcher
+from aiogram import Bot, Dispatcher, BaseMiddleware
 from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, BotCommand, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from aiogram.exceptions import DataNotDictLikeError
+from typing import Any, Mapping
 
 import calendar
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 action_to_icon = {
    "dayin": "➡️🚪",
@@ -132,17 +175,456 @@ async def on_startup(bot: Bot):
         BotCommand(command="cancel", description="Cancel the current action"),
     ])
 
-dp = Dispatcher(storage=MemoryStorage())
+class JsonSubscriberStore:
+    """One subscribers/<id>.json file per subscriber"""
+    def __init__(self, path: str = 'subscribers'):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def load(self, user_id) -> dict | None:
+        if os.path.exists(f'{self.path}/{user_id}.json'):
+            return json.load(open(f'{self.path}/{user_id}.json'))
+        return None
+
+    def save(self, s: dict):
+        # write a temp file and rename it over the old one, a crash never leaves a torn subscriber file
+        data = json.dumps(s, indent=2, ensure_ascii=False)
+        with open(tmp := f'{self.path}/.{s['id']}.json.tmp', "w") as f:
+            f.write(data)
+        os.replace(tmp, f'{self.path}/{s['id']}.json')
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Exclusive lock on the directory, shared with the other processes using it"""
+        with open(f'{self.path}/.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def merge(self, user_id, apply) -> dict | None:
+        """Read-modify-write of one record under the directory lock: apply(stored record or None) returns what to write, None to skip"""
+        with self._locked():
+            if (s := apply(self.load(user_id))) is not None:
+                self.save(s)
+            return s
+
+    def delete(self, user_id) -> bool:
+        with self._locked():
+            if os.path.exists(f'{self.path}/{user_id}.json'):
+                os.remove(f'{self.path}/{user_id}.json')
+                return True
+            return False
+
+    def ids(self) -> list[int]:
+        return [int(f.removesuffix('.json')) for f in os.listdir(self.path) if f.endswith('.json')]
+
+    def versions(self) -> dict[int, float]:
+        """Last write time of every subscriber, lets other processes notice changed and deleted records"""
+        return {int(e.name.removesuffix('.json')): e.stat().st_mtime_ns for e in os.scandir(self.path) if e.name.endswith('.json')}
+
+    def ids_with_schedule(self) -> list[int]:
+        """Subscribers with a schedule for at least one week day"""
+        return [user_id for user_id in self.ids() if (s := self.load(user_id)) and any(a and a != 'N/A' for a in s.get('weekly_schedule') or [])]
+
+class SqliteSubscriberStore:
+    """
+    Subscribers in a SQLite database (WAL mode). Schedule, clock log, Jira worklogs and Bamboo status get their own tables,
+    keys without a column of their own are kept in subscribers.extra so load() returns the same dict the JSON store does.
+    """
+    columns = ('username', 'first_name', 'last_name', 'timezone', 'pause_reminders', 'bamboo_phpsessid', 'jira_credentials')
+    schema = """
+        CREATE TABLE IF NOT EXISTS subscribers (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            timezone TEXT NOT NULL DEFAULT 'UTC',
+            pause_reminders TEXT,
+            bamboo_phpsessid TEXT,
+            jira_credentials TEXT,
+            extra TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS weekly_schedule (
+            user_id INTEGER NOT NULL REFERENCES subscribers (id) ON DELETE CASCADE,
+            week_day INTEGER NOT NULL,
+            day_in TEXT NOT NULL,
+            lunch_out TEXT NOT NULL,
+            day_out TEXT NOT NULL,
+            PRIMARY KEY (user_id, week_day)
+        );
+        CREATE TABLE IF NOT EXISTS clock_log (
+            user_id INTEGER NOT NULL REFERENCES subscribers (id) ON DELETE CASCADE,
+            action TEXT NOT NULL,
+            at TEXT,
+            PRIMARY KEY (user_id, action)
+        );
+        CREATE TABLE IF NOT EXISTS jira_worklogs (
+            user_id INTEGER NOT NULL REFERENCES subscribers (id) ON DELETE CASCADE,
+            worklog_id TEXT,
+            issue_key TEXT,
+            time_spent TEXT,
+            time_spent_seconds INTEGER,
+            comment TEXT,
+            date TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jira_worklogs_user_date ON jira_worklogs (user_id, date);
+        CREATE TABLE IF NOT EXISTS bamboo_status (
+            user_id INTEGER PRIMARY KEY REFERENCES subscribers (id) ON DELETE CASCADE,
+            status TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = 'subscribers.sqlite3'):
+        self.path = path
+        # shared by the event loop and the Jira worker threads, every access goes through self.lock
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.execute("PRAGMA busy_timeout=5000")  # other worker processes may hold the write lock
+        self.db.executescript(self.schema)
+
+    def load(self, user_id) -> dict | None:
+        with self.lock:
+            if not (row := self.db.execute("SELECT * FROM subscribers WHERE id = ?", (int(user_id),)).fetchone()):
+                return None
+            s = {'id': row['id'], **{c: row[c] for c in self.columns if row[c] is not None}}
+            s.update(json.loads(row['extra']))
+            s['log'] = {r['action']: r['at'] for r in self.db.execute("SELECT action, at FROM clock_log WHERE user_id = ? ORDER BY rowid", (row['id'],))}
+            schedule = ['N/A'] * 7
+            for r in self.db.execute("SELECT * FROM weekly_schedule WHERE user_id = ?", (row['id'],)):
+                schedule[r['week_day'] - 1] = f"{r['week_day']},{r['day_in']},{r['lunch_out']},{r['day_out']}"
+            s['weekly_schedule'] = schedule
+            if status := self.db.execute("SELECT status FROM bamboo_status WHERE user_id = ?", (row['id'],)).fetchone():
+                s['bamboo_status'] = json.loads(status['status'])
+            worklogs = self.db.execute("SELECT * FROM jira_worklogs WHERE user_id = ? ORDER BY rowid", (row['id'],)).fetchall()
+            if worklogs or 'jira_status' in s:
+                s['jira_status'] = [{k: r[k] for k in r.keys() if k != 'user_id' and (k != 'worklog_id' or r[k])} for r in worklogs]
+            return s
+
+    def save(self, s: dict):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(s)
+                self.db.execute("COMMIT")
+            except:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def merge(self, user_id, apply) -> dict | None:
+        """Read-modify-write of one record in one write transaction: apply(stored record or None) returns what to write, None to skip"""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                if (s := apply(self.load(user_id))) is not None:
+                    self._write(s)
+                self.db.execute("COMMIT")
+            except:
+                self.db.execute("ROLLBACK")
+                raise
+            return s
+
+    def _write(self, s: dict):
+        user_id = int(s['id'])
+        extra = {k: v for k, v in s.items() if k not in ('id', 'log', 'weekly_schedule', 'bamboo_status', 'jira_status', *self.columns)}
+        if 'jira_status' in s and not s['jira_status']:
+            extra['jira_status'] = []  # remember an empty (synced) list apart from "never synced"
+        self.db.execute(
+            f"INSERT INTO subscribers (id, {', '.join(self.columns)}, extra, updated_at) VALUES (?, {', '.join('?' * len(self.columns))}, ?, ?) "
+            f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in self.columns)}, extra = excluded.extra, updated_at = excluded.updated_at",
+            (user_id, *[s.get(c) if c != 'timezone' else s.get(c) or 'UTC' for c in self.columns], json.dumps(extra, ensure_ascii=False), time.time()),
+        )
+        self.db.execute("DELETE FROM clock_log WHERE user_id = ?", (user_id,))
+        self.db.executemany("INSERT INTO clock_log (user_id, action, at) VALUES (?, ?, ?)", [(user_id, k, v) for k, v in (s.get('log') or {}).items()])
+        self.db.execute("DELETE FROM weekly_schedule WHERE user_id = ?", (user_id,))
+        self.db.executemany(
+            "INSERT INTO weekly_schedule (user_id, week_day, day_in, lunch_out, day_out) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, int(a.split(',')[0]), *a.split(',')[1:]) for a in s.get('weekly_schedule') or [] if a and a != 'N/A' and len(a.split(',')) == 4],
+        )
+        if 'bamboo_status' in s:
+            self.db.execute("INSERT OR REPLACE INTO bamboo_status (user_id, status, updated_at) VALUES (?, ?, ?)", (user_id, json.dumps(s['bamboo_status'], ensure_ascii=False), time.time()))
+        else:
+            self.db.execute("DELETE FROM bamboo_status WHERE user_id = ?", (user_id,))
+        self.db.execute("DELETE FROM jira_worklogs WHERE user_id = ?", (user_id,))
+        self.db.executemany(
+            "INSERT INTO jira_worklogs (user_id, worklog_id, issue_key, time_spent, time_spent_seconds, comment, date) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(user_id, e.get('worklog_id'), e.get('issue_key'), e.get('time_spent'), e.get('time_spent_seconds'), e.get('comment'), e['date']) for e in s.get('jira_status') or []],
+        )
+
+    def delete(self, user_id) -> bool:
+        with self.lock:
+            return self.db.execute("DELETE FROM subscribers WHERE id = ?", (int(user_id),)).rowcount > 0
+
+    def ids(self) -> list[int]:
+        with self.lock:
+            return [r[0] for r in self.db.execute("SELECT id FROM subscribers")]
+
+    def versions(self) -> dict[int, float]:
+        """Last write time of every subscriber, lets other processes notice changed and deleted records"""
+        with self.lock:
+            return dict(self.db.execute("SELECT id, updated_at FROM subscribers").fetchall())
+
+    def ids_with_schedule(self) -> list[int]:
+        """Subscribers with a schedule for at least one week day"""
+        with self.lock:
+            return [r[0] for r in self.db.execute("SELECT DISTINCT user_id FROM weekly_schedule")]
+
+    def import_json_dir(self, path: str = 'subscribers') -> int:
+        """One-shot import of a JSON store directory, existing rows for the same ids are overwritten"""
+        source = JsonSubscriberStore(path)
+        for user_id in (ids := source.ids()):
+            self.save(source.load(user_id))
+        return len(ids)
+
+store = SqliteSubscriberStore(os.getenv('SUBSCRIBER_DB', 'subscribers.sqlite3')) if os.getenv('SUBSCRIBER_STORE', 'json') == 'sqlite' else JsonSubscriberStore()
+
+class SqliteFsmStorage(BaseStorage):
+    """
+    FSM states and data in SQLite, so pending conversations survive restarts and can be shared by several processes on
+    the same host. States untouched for longer than state_ttl seconds count as abandoned: they read as empty and get purged.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS fsm (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at);
+    """
+
+    def __init__(self, path: str = 'subscribers.sqlite3', state_ttl: float = 86400):
+        self.path = path
+        self.state_ttl = state_ttl
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(self.schema)
+        self.purged_at = 0.0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.business_connection_id or ''}:{key.destiny}"
+
+    def _row(self, key: StorageKey) -> tuple[str | None, dict]:
+        row = self.db.execute("SELECT state, data FROM fsm WHERE key = ? AND updated_at >= ?", (self._key(key), time.time() - self.state_ttl)).fetchone()
+        return (row[0], json.loads(row[1])) if row else (None, {})
+
+    def _write(self, key: StorageKey, state: str | None, data: dict):
+        now = time.time()
+        if state is None and not data:
+            self.db.execute("DELETE FROM fsm WHERE key = ?", (self._key(key),))
+        else:
+            self.db.execute("INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data, updated_at = excluded.updated_at",
+                            (self._key(key), state, json.dumps(data, ensure_ascii=False), now))
+        if now - self.purged_at > 60:
+            self.purged_at = now
+            self.db.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.state_ttl,))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._write(key, state.state if isinstance(state, State) else state, self._row(key)[1])
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return self._row(key)[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        self._write(key, self._row(key)[0], data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return self._row(key)[1]
+
+    async def close(self) -> None:
+        self.db.close()
+
+def fsm_storage() -> BaseStorage:
+    """FSM_STORAGE: memory (lost on restart), sqlite (FSM_DB, one host) or redis (REDIS_URL, needs the redis package)"""
+    state_ttl = float(os.getenv('FSM_STATE_TTL', 60*60*24))
+    match os.getenv('FSM_STORAGE', 'sqlite'):
+        case 'memory':
+            return MemoryStorage()
+        case 'redis':
+            from aiogram.fsm.storage.redis import RedisStorage
+            return RedisStorage.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'), state_ttl=int(state_ttl), data_ttl=int(state_ttl))
+        case _:
+            return SqliteFsmStorage(os.getenv('FSM_DB', os.getenv('SUBSCRIBER_DB', 'subscribers.sqlite3')), state_ttl)
+
+dp = Dispatcher(storage=fsm_storage())
+
+MISSING = object()
+
+def merge_changes(stored: dict | None, base: dict | None, s: dict) -> dict | None:
+    """
+    Apply what changed between base (the record as last read from the store) and s onto stored (the record in the store
+    now), so writes of other processes to other fields survive. Dict fields (log, last_reminder...) are merged key by key.
+    None when another process deleted the record meanwhile.
+    """
+    if stored is None:
+        return None if base is not None else s
+    merged, base = dict(stored), base or {}
+    for k in s.keys() | base.keys():
+        if (new := s.get(k, MISSING)) == (old := base.get(k, MISSING)):
+            continue
+        if isinstance(new, dict) and isinstance(old, dict) and isinstance(merged.get(k), dict):
+            merged[k] = {**merged[k], **{sub: v for sub, v in new.items() if old.get(sub, MISSING) != v}}
+            for sub in old.keys() - new.keys():
+                merged[k].pop(sub, None)
+        elif new is MISSING:
+            merged.pop(k, None)
+        else:
+            merged[k] = new
+    return merged
+
+class SubscriberCache:
+    """
+    Process-wide write-through cache in front of the store. Every subscriber is loaded once and the same dict is handed out,
+    saves mark the record dirty and all saves within SUBSCRIBER_FLUSH_DELAY seconds are written to the store in one flush.
+    When the store is shared (WORKER_MODE bot/worker), a flush only writes the fields that changed since the record was
+    read (merge_changes), re-reading the stored record under the store's lock, so bot and worker processes sharing a store
+    never overwrite each other's fields. A single process (WORKER_MODE=all) just saves the record.
+    """
+    def __init__(self, store: JsonSubscriberStore | SqliteSubscriberStore, flush_delay: float = float(os.getenv('SUBSCRIBER_FLUSH_DELAY', '1')),
+                 shared: bool = os.getenv('WORKER_MODE', 'all') != 'all'):
+        self.store = store
+        self.flush_delay = flush_delay
+        self.shared = shared
+        self._records: dict[int, dict] = {}
+        self._dirty: set[int] = set()
+        self._lock = threading.RLock()  # saves also come from the Jira worker threads
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._flush_scheduled = False
+        self._versions: dict[int, int] = {}
+        self._seen: dict[int, float] = {}  # store versions() as of the last sync()
+        self._base: dict[int, dict] = {}  # copy of every cached record as last read from/written to the store
+
+    def load(self, user_id) -> dict | None:
+        user_id = int(user_id)
+        with self._lock:
+            if (s := self._records.get(user_id)) is None and (s := self.store.load(user_id)) is not None:
+                self._records[user_id] = s
+                if self.shared:
+                    self._base[user_id] = copy.deepcopy(s)
+            return s
+
+    def version(self, user_id) -> int:
+        """Bumped on every save, tells cached views of the record (e.g. the rendered /my_info) that it changed"""
+        return self._versions.get(int(user_id), 0)
+
+    def save(self, s: dict):
+        with self._lock:
+            self._records[int(s['id'])] = s
+            self._dirty.add(int(s['id']))
+            self._versions[int(s['id'])] = self._versions.get(int(s['id']), 0) + 1
+        self._schedule_flush()
+
+    def delete(self, user_id) -> bool:
+        with self._lock:
+            self._records.pop(int(user_id), None)
+            self._base.pop(int(user_id), None)
+            self._dirty.discard(int(user_id))
+            self._versions[int(user_id)] = self._versions.get(int(user_id), 0) + 1
+            return self.store.delete(user_id)
+
+    def _schedule_flush(self):
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if self._loop is None or self._loop.is_closed():
+                return self.flush()  # no event loop (e.g. import-json), write right away
+            return self._loop.call_soon_threadsafe(self._schedule_flush)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        with self._lock:
+            self._flush_scheduled = False
+            dirty, self._dirty = self._dirty, set()
+            for user_id in dirty:
+                s = self._records[user_id]
+                try:
+                    if not self.shared:
+                        self.store.save(s)
+                        continue
+                    merged = self.store.merge(user_id, lambda stored: merge_changes(stored, self._base.get(user_id), s))
+                except Exception as e:
+                    self._dirty.add(user_id)
+                    logger.error(f"Error saving subscriber {user_id}: {e}")
+                    continue
+                if merged is None:
+                    # unsubscribed in another process, don't bring the record back
+                    del self._records[user_id]
+                    self._base.pop(user_id, None)
+                    self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                    continue
+                if merged != s:
+                    # picked up fields another process wrote
+                    s.clear()
+                    s.update(merged)
+                    self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                self._base[user_id] = copy.deepcopy(merged)
+
+    def sync(self) -> tuple[set[int], set[int]]:
+        """
+        Pick up records another process wrote or deleted since the last sync, returns the (changed, deleted) ids.
+        Cached records are updated in place, so dicts already handed out see the new content. Locally dirty records are
+        left to the next flush, which merges them with the stored record.
+        """
+        self.flush()
+        versions = self.store.versions()
+        changed, deleted = set(), set()
+        with self._lock:
+            for user_id, version in versions.items():
+                if self._seen.get(user_id) == version:
+                    continue
+                self._seen[user_id] = version
+                if user_id in self._dirty:
+                    continue
+                if (s := self._records.get(user_id)) is None:
+                    changed.add(user_id)
+                elif (fresh := self.store.load(user_id)) is not None and fresh != s:
+                    s.clear()
+                    s.update(fresh)
+                    self._base[user_id] = copy.deepcopy(fresh)
+                    self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                    changed.add(user_id)
+            for user_id in self._seen.keys() - versions.keys():
+                del self._seen[user_id]
+                if user_id not in self._dirty and self._records.pop(user_id, None) is not None:
+                    self._base.pop(user_id, None)
+                    self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                deleted.add(user_id)
+        return changed, deleted
+
+    def ids(self) -> list[int]:
+        self.flush()
+        return self.store.ids()
+
+    def ids_with_schedule(self) -> list[int]:
+        self.flush()
+        return self.store.ids_with_schedule()
+
+subscribers = SubscriberCache(store)
+atexit.register(subscribers.flush)
 
-os.makedirs('subscribers', exist_ok=True)
 def is_subscribed(user_id) -> dict | None:
-    if os.path.exists(f'subscribers/{user_id}.json'):
-        return json.load(open(f'subscribers/{user_id}.json'))
-    return None
+    return subscribers.load(user_id)
+
+def save_subscriber(s: dict):
+    subscribers.save(s)
+
+def delete_subscriber(user_id) -> bool:
+    return subscribers.delete(user_id)
 
 def subscribe(message: Message):
     if not is_subscribed(user_id := message.from_user.id):
-        json.dump({
+        save_subscriber({
             'id': message.from_user.id,
             'username': message.from_user.username,
             'first_name': message.from_user.first_name,
@@ -163,18 +645,98 @@ def subscribe(message: Message):
                 "N/A",
                 "N/A"
             ]
-        }, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
+        })
+        reminders.reschedule(user_id)
         
 def subscriber(user_id) -> dict:
-    return json.load(open(f'subscribers/{user_id}.json')) if os.path.exists(f'subscribers/{user_id}.json') else None
+    return subscribers.load(user_id)
+
+user_locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+def user_lock(user_id) -> asyncio.Lock:
+    """
+    Serializes read-modify-write of one subscriber's state, different subscribers never wait for each other.
+    Not reentrant, don't await anything that takes the same lock while holding it.
+    """
+    if (lock := user_locks.get(int(user_id))) is None:
+        user_locks[int(user_id)] = lock = asyncio.Lock()
+    return lock
+
+async def merge_subscriber(user_id, fields: dict, expect: dict | None = None) -> dict | None:
+    """Write only the given fields into the current record, skipped if the subscriber is gone or any expect field changed meanwhile"""
+    async with user_lock(user_id):
+        if not (s := subscriber(user_id)) or any(s.get(k) != v for k, v in (expect or {}).items()):
+            return None
+        s.update(fields)
+        save_subscriber(s)
+        return s
 
 def my_info(user_id) -> str:
-    s = subscriber(user_id)
-    return my_info_from_user_id(user_id)
+    return f"{my_info_from_user_id(user_id)}{refreshed_marker(subscriber(user_id))}"
+
+def refreshed_marker(s: dict) -> str:
+    """When the cached Bamboo HR/Jira state shown in /my_info was last refreshed"""
+    refreshed = {name: s.get(k) for name, k, credentials in (('Bamboo HR', 'bamboo_refreshed_at', 'bamboo_phpsessid'), ('Jira', 'jira_refreshed_at', 'jira_credentials')) if s.get(credentials)}
+    if not refreshed:
+        return ""
+    if not all(refreshed.values()):
+        return f"\n\n🔄 {'/'.join(refreshed)} not refreshed yet"
+    age = int((datetime.now(timezone.utc) - min(datetime.fromisoformat(t) for t in refreshed.values())).total_seconds())
+    return f"\n\n🔄 {'/'.join(refreshed)} refreshed {age}s ago" if age < 120 else f"\n\n🔄 {'/'.join(refreshed)} refreshed {age // 60}m ago"
+
+def refresh_age(s: dict) -> float:
+    """Seconds since the least recently refreshed integration of the subscriber, inf if one was never refreshed"""
+    times = [s.get(k) for k, credentials in (('bamboo_refreshed_at', 'bamboo_phpsessid'), ('jira_refreshed_at', 'jira_credentials')) if s.get(credentials)]
+    if not all(times):
+        return float('inf')
+    return max([(datetime.now(timezone.utc) - datetime.fromisoformat(t)).total_seconds() for t in times], default=0)
+
+MY_INFO_REFRESH_AGE = float(os.getenv('MY_INFO_REFRESH_AGE', '60'))
+refresh_tasks: dict[int, asyncio.Task] = {}
+background_tasks: set[asyncio.Task] = set()
+
+async def refresh_integrations(user_id):
+    current_user_id.set(int(user_id))  # own task, see start_refresh()
+    try:
+        if s := subscriber(user_id):
+            await asyncio.gather(update_bamboo_status(s), update_jira_status(s))
+    finally:
+        refreshes.reschedule(user_id)
+
+def start_refresh(user_id) -> asyncio.Task:
+    """Refresh Bamboo HR and Jira state of the subscriber, joins the refresh already in flight for the same user"""
+    user_id = int(user_id)
+    if (task := refresh_tasks.get(user_id)) is None or task.done():
+        refresh_tasks[user_id] = task = asyncio.create_task(refresh_integrations(user_id))
+        task.add_done_callback(lambda t: refresh_tasks.pop(user_id, None) if refresh_tasks.get(user_id) is t else None)
+    return task
+
+async def send_my_info(user_id, message: Message, edit: bool = False, force_refresh: bool = False) -> Message:
+    """
+    Answer (or edit) with /my_info rendered from the cached state right away, then refresh Bamboo HR/Jira in background
+    and edit the same message if the info or its refreshed marker changed. Cached state younger than MY_INFO_REFRESH_AGE
+    is not refreshed unless forced.
+    """
+    text = my_info(user_id)
+    sent = await (message.edit_text(text, parse_mode='HTML') if edit else message.answer(text, parse_mode='HTML'))
+    if (s := subscriber(user_id)) and (force_refresh or refresh_age(s) > MY_INFO_REFRESH_AGE) and (s.get('bamboo_phpsessid') or s.get('jira_credentials')):
+        task = asyncio.create_task(revalidate_my_info(user_id, sent, text))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    return sent
+
+async def revalidate_my_info(user_id, sent: Message, shown: str):
+    try:
+        await start_refresh(user_id)
+        if subscriber(user_id) and (text := my_info(user_id)) != shown:
+            await sent.edit_text(text, parse_mode='HTML')
+    except TelegramBadRequest as e:
+        logger.warning(f"Could not update /my_info of {user_id}: {e}")
+    except Exception as e:
+        logger.exception(f"Error refreshing /my_info of {user_id}: {e}")
 
 def date_diff_in_hhmm(date1_str: str, date2_str: str) -> str:
-    fmt = '%Y-%m-%d %H:%M:%S'
-    delta = abs(datetime.strptime(date2_str, fmt) - datetime.strptime(date1_str, fmt))
+    delta = abs(datetime.fromisoformat(date2_str) - datetime.fromisoformat(date1_str))
     
     total_minutes = int(delta.total_seconds() // 60)
     hours = total_minutes // 60
@@ -182,57 +744,72 @@ def date_diff_in_hhmm(date1_str: str, date2_str: str) -> str:
     
     return f"{hours:02d}h:{minutes:02d}m"
 
-def my_info_from_user_id(user_id: int) -> str:
-    s = json.load(open(f'subscribers/{user_id}.json'))
-    msg = ""
-    # msg += f"👤 <b>{message.from_user.full_name}</b>\n\n"
-    msg += f"⏱️ Daily Log for: {datetime.now(ZoneInfo(timezone := s.get('timezone', 'UTC'))).strftime('%Y-%m-%d, %a')}:\n"
+@lru_cache(maxsize=None)
+def zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+@lru_cache(maxsize=None)
+def action_label(action: str) -> str:
+    return f"{action_to_icon[action.lower()]} {action.upper().replace('IN', ' IN').replace('OUT', ' OUT')} (/{action.lower()})"
+
+def render_my_info(s: dict, now: datetime | None = None) -> str:
+    """/my_info text of a subscriber, "now" and "today" are computed once per render"""
+    tz = zone(timezone_name := s.get('timezone', 'UTC'))
+    now = (now or datetime.now(tz)).astimezone(tz)
+    today = now.date()
+    parts = [f"⏱️ Daily Log for: {now.strftime('%Y-%m-%d, %a')}:\n"]
     for k, v in s['log'].items():
-        msg += f"  {action_to_icon[k.lower()]} {k.upper().replace('IN', ' IN').replace('OUT', ' OUT')} (/{k.lower()}) - <code>{datetime.fromisoformat(v).astimezone(ZoneInfo(timezone)).strftime('%H:%M:%S')}</code>\n" if v and datetime.fromisoformat(v).astimezone(ZoneInfo(timezone)).strftime('%Y-%m-%d') == datetime.now(ZoneInfo(timezone)).strftime('%Y-%m-%d') else f"  {action_to_icon[k.lower()]} {k.upper().replace('IN', ' IN').replace('OUT', ' OUT')} (/{k.lower()}) -\n"
-    msg += f"\n📅 Weekly schedule [/set_daily_schedule]:\n"
-    msg += "[week_day,day_in,lunch_out,day_out]\n"
-    for i, v in enumerate(s.get('weekly_schedule', ['N/A']*7)):
-        msg += f"<code>{v}</code> [{calendar.day_abbr[i]}]\n" if v else f"N/A [{calendar.day_abbr[i]}]\n"
-    msg += f"\n🌍 Timezone: <code>{timezone}</code>\nUse /set_timezone to update\n"
-    if stop_until_str := s.get('pause_reminders'):
-        stop_until = datetime.fromisoformat(stop_until_str).astimezone(ZoneInfo(timezone))
-        now = datetime.now(ZoneInfo(timezone))
-        if now < stop_until:
-            msg += f"\n⏸️ Reminders paused until: <code>{stop_until.strftime('%Y-%m-%d %H:%M')}</code>\nUse /resume_reminders to resume immediately\n"
+        if v and (at := datetime.fromisoformat(v).astimezone(tz)).date() == today:
+            parts.append(f"  {action_label(k)} - <code>{at.strftime('%H:%M:%S')}</code>\n")
         else:
-            msg += f"\n✅ Reminders active (/pause_reminders)\n"
+            parts.append(f"  {action_label(k)} -\n")
+    parts.append("\n📅 Weekly schedule [/set_daily_schedule]:\n[week_day,day_in,lunch_out,day_out]\n")
+    for i, v in enumerate(s.get('weekly_schedule', ['N/A']*7)):
+        parts.append(f"<code>{v}</code> [{calendar.day_abbr[i]}]\n" if v else f"N/A [{calendar.day_abbr[i]}]\n")
+    parts.append(f"\n🌍 Timezone: <code>{timezone_name}</code>\nUse /set_timezone to update\n")
+    if (stop_until_str := s.get('pause_reminders')) and now < (stop_until := datetime.fromisoformat(stop_until_str).astimezone(tz)):
+        parts.append(f"\n⏸️ Reminders paused until: <code>{stop_until.strftime('%Y-%m-%d %H:%M')}</code>\nUse /resume_reminders to resume immediately\n")
     else:
-        msg += f"\n✅ Reminders active (/pause_reminders)\n"
+        parts.append("\n✅ Reminders active (/pause_reminders)\n")
     if t := s.get('bamboo_phpsessid'):
-        msg += f"\n🔐 Bamboo HR PHPSESSID:\n<code>{t[:5]}**{t[-5:]}</code>\nUse /unset_bamboo_phpsessid to unset\nUse /set_bamboo_phpsessid to update\n"
-        msg += f"\nBamboo HR Log:\n"
+        parts.append(f"\n🔐 Bamboo HR PHPSESSID:\n<code>{t[:5]}**{t[-5:]}</code>\nUse /unset_bamboo_phpsessid to unset\nUse /set_bamboo_phpsessid to update\n")
+        parts.append("\nBamboo HR Log:\n")
         if err := s.get('bamboo_status', {}).get('error'):
-            msg += f" ❗{err}\n"
+            parts.append(f" ❗{err}\n")
+        now_str = now.strftime('%Y-%m-%d %H:%M:%S')
         for log in s.get('bamboo_status', {}).get('clockEntries', []):
-            msg += f"  {log.get('start').split(' ')[1]} -> {log.get('end').split(' ')[1] if log.get('end') else 'now'}, {date_diff_in_hhmm(log.get('start'), log.get('end') or datetime.now(ZoneInfo(timezone)).strftime('%Y-%m-%d %H:%M:%S'))}\n"
+            parts.append(f"  {log.get('start').split(' ')[1]} -> {log.get('end').split(' ')[1] if log.get('end') else 'now'}, {date_diff_in_hhmm(log.get('start'), log.get('end') or now_str)}\n")
     else:
-        msg += f"\n🔐 Bamboo HR PHPSESSID: N/A\nuse /set_bamboo_phpsessid to set\n"
+        parts.append("\n🔐 Bamboo HR PHPSESSID: N/A\nuse /set_bamboo_phpsessid to set\n")
     if j := s.get('jira_credentials'):
         jemail, jtoken = j.split(',')
-        jtoken = f"{jtoken[:5]}**{jtoken[-5:]}"
-        j = f"{jemail},{jtoken}"
-        msg += f"\n🐞 Jira Credentials:\n<code>{j}</code>\nUse /unset_jira_credentials to unset\nUse /set_jira_credentials to update\nUse /add_jira_worklog to add Jira worklog.\n"
-        msg += f"\n🐞 Worklog for today (/add_jira_worklog):\n"
+        parts.append(f"\n🐞 Jira Credentials:\n<code>{jemail},{jtoken[:5]}**{jtoken[-5:]}</code>\nUse /unset_jira_credentials to unset\nUse /set_jira_credentials to update\nUse /add_jira_worklog to add Jira worklog.\n")
+        parts.append("\n🐞 Worklog for today (/add_jira_worklog):\n")
         total_time_spent_seconds_today = 0
         for jira_status in s.get('jira_status') or []:
-            if datetime.fromisoformat(jira_status['date']).astimezone(ZoneInfo(timezone)).strftime('%Y-%m-%d') == datetime.now(ZoneInfo(timezone)).strftime('%Y-%m-%d'):
-                msg += f"    <code>{jira_status['issue_key']}</code> [{jira_status['time_spent']}]: {jira_status['comment']} [<i>{datetime.fromisoformat(jira_status['date']).astimezone(ZoneInfo(timezone)).strftime('%H:%M')}</i>]\n"
+            if (d := datetime.fromisoformat(jira_status['date']).astimezone(tz)).date() == today:
+                parts.append(f"    <code>{jira_status['issue_key']}</code> [{jira_status['time_spent']}]: {jira_status['comment']} [<i>{d.strftime('%H:%M')}</i>]\n")
                 total_time_spent_seconds_today += jira_status['time_spent_seconds']
-        msg += f"\n    Total time logged today: <b>{jira_seconds_to_workdays(total_time_spent_seconds_today)}</b>\n"
-        # for jira_status in s.get('jira_status') or []:
-        #     if datetime.fromisoformat(jira_status['date']).astimezone(ZoneInfo(timezone)).strftime('%Y-%m-%d') != datetime.now(ZoneInfo(timezone)).strftime('%Y-%m-%d'):
-        #         msg += f"    <code>{jira_status['issue_key']}</code> [{jira_status['time_spent']}]: {jira_status['comment']} [<i>{datetime.fromisoformat(jira_status['date']).astimezone(ZoneInfo(timezone)).strftime('%Y-%m-%d %H:%M')}</i>]\n"
-        
+        parts.append(f"\n    Total time logged today: <b>{jira_seconds_to_workdays(total_time_spent_seconds_today)}</b>\n")
     else:
-        msg += f"\n🐞 Jira credentials: N/A\nuse /set_jira_credentials to set\n"
-    msg += f"\nℹ️ Use /my_info to show your info."
-    
-    return msg.strip()
+        parts.append("\n🐞 Jira credentials: N/A\nuse /set_jira_credentials to set\n")
+    parts.append("\nℹ️ Use /my_info to show your info.")
+    return ''.join(parts).strip()
+
+rendered_my_info: dict[int, tuple[tuple, str]] = {}  # user id -> (memo key, text)
+
+def my_info_from_user_id(user_id: int) -> str:
+    """
+    render_my_info() memoised by the subscriber's state version and the current minute in their timezone,
+    the only time dependent parts of the text (date, pause, open Bamboo entry) change at most once a minute.
+    """
+    s = subscriber(user_id)
+    now = datetime.now(zone(s.get('timezone', 'UTC')))
+    key = (subscribers.version(user_id), s.get('timezone', 'UTC'), now.strftime('%Y-%m-%d %H:%M'))
+    if (cached := rendered_my_info.get(int(user_id))) and cached[0] == key:
+        return cached[1]
+    rendered_my_info[int(user_id)] = (key, text := render_my_info(s, now))
+    return text
 
 @dp.message(Command("start"))
 async def command_start_handler(message: Message) -> None:
@@ -273,31 +850,305 @@ async def command_cancel_handler(message: Message, state: FSMContext) -> None:
     else:
         await message.answer("ℹ️ Nothing to cancel.")
     
-def update_bamboo_status(user: dict):
-    if t := user.get('bamboo_phpsessid'):
-        s = requests.Session()
-        s.cookies.update({"PHPSESSID": t})
-        r = s.get("https://knowledgecity.bamboohr.com/widget/timeTracking")
+SLOW_CALL_SECONDS = float(os.getenv('SLOW_CALL_SECONDS', '2'))  # handlers and Bamboo HR/Jira/Telegram calls slower than this are logged
+current_user_id: contextvars.ContextVar[int | None] = contextvars.ContextVar('current_user_id', default=None)
+
+class LatencyHistogram:
+    """Calls, errors and latency bucket counts since start, plus the latest samples for percentiles"""
+    buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is > buckets[-1]
+        self.calls = 0
+        self.errors = 0
+        self.seconds_total = 0.0
+        self.recent: deque[float] = deque(maxlen=1000)
+
+    def observe(self, seconds: float, error: bool = False):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.calls += 1
+        self.errors += error
+        self.seconds_total += seconds
+        self.recent.append(seconds)
+
+    def percentiles(self) -> dict[str, float]:
+        samples = sorted(self.recent)
+        return {f"p{p}": samples[min(len(samples) - 1, len(samples) * p // 100)] for p in (50, 90, 99)} if samples else {}
+
+timings: dict[str, LatencyHistogram] = {}
+def timing(name: str) -> LatencyHistogram:
+    if (histogram := timings.get(name)) is None:
+        histogram = timings[name] = LatencyHistogram()
+    return histogram
+
+@contextlib.contextmanager
+def timed(name: str, **fields):
+    """
+    Times the block into timings[name]. An exception or fields['error'] set inside the block counts as an error, a call
+    slower than SLOW_CALL_SECONDS is logged with the user id and the fields (never put credentials in them).
+    """
+    started = time.perf_counter()
+    error = False
+    try:
+        yield fields
+    except Exception:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        error = error or bool(fields.pop('error', False))
+        timing(name).observe(seconds, error)
+        if seconds >= SLOW_CALL_SECONDS:
+            logger.warning(' '.join(f"{k}={v}" for k, v in {'slow_call': name, 'seconds': f"{seconds:.3f}", 'user_id': current_user_id.get(), 'error': error, **fields}.items()))
+
+class HandlerTimer(BaseMiddleware):
+    """Inner middleware timing every message/callback handler as handler:<function name>"""
+    async def __call__(self, handler, event, data: dict):
+        token = current_user_id.set(user.id if (user := data.get('event_from_user')) else None)
+        try:
+            with timed(f"handler:{data['handler'].callback.__name__}"):
+                return await handler(event, data)
+        finally:
+            current_user_id.reset(token)
+
+dp.message.middleware(HandlerTimer())
+dp.callback_query.middleware(HandlerTimer())
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    """
+    Per-host breaker: after `threshold` consecutive host failures (timeouts, connection errors, 5xx) calls fail fast with
+    CircuitOpenError for `backoff` seconds, then a single probe call goes through. A failed probe doubles the backoff
+    up to max_backoff, any success closes the circuit again.
+    """
+    def __init__(self, name: str, threshold: int = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')), backoff: float = float(os.getenv('CIRCUIT_BACKOFF', '30')), max_backoff: float = float(os.getenv('CIRCUIT_MAX_BACKOFF', '900'))):
+        self.name = name
+        self.threshold = threshold
+        self.base_backoff = self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.threshold
+
+    def check(self):
+        if not self.is_open:
+            return
+        if (now := time.monotonic()) < self.open_until:
+            raise CircuitOpenError(f"{self.name} is unavailable, retrying in {self.open_until - now:.0f}s")
+        # backoff is over: this call is the probe, the others keep failing fast until it is back
+        self.open_until = now + self.backoff
+        self.probing = True
+
+    def success(self):
+        if self.is_open:
+            logger.info(f"Circuit for {self.name} closed")
+        self.failures, self.probing, self.backoff = 0, False, self.base_backoff
+
+    def failure(self):
+        self.failures += 1
+        if self.probing:
+            self.probing = False
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.open_until = time.monotonic() + self.backoff
+            logger.warning(f"Circuit for {self.name} still open, next probe in {self.backoff:.0f}s")
+        elif self.failures == self.threshold:
+            self.open_until = time.monotonic() + self.backoff
+            logger.warning(f"Circuit for {self.name} opened after {self.failures} failures, next probe in {self.backoff:.0f}s")
+
+circuits: dict[str, CircuitBreaker] = {}
+def circuit(host: str) -> CircuitBreaker:
+    if (breaker := circuits.get(host)) is None:
+        breaker = circuits[host] = CircuitBreaker(host)
+    return breaker
+
+class BambooClient:
+    """Shared async Bamboo HR client: one keep-alive connection pool for every user, PHPSESSID is sent per request"""
+    def __init__(self, base_url: str = os.getenv('BAMBOO_BASE_URL', 'https://knowledgecity.bamboohr.com'), timeout: float = float(os.getenv('BAMBOO_TIMEOUT', '10'))):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        self.limits = httpx.Limits(max_connections=int(os.getenv('BAMBOO_MAX_CONNECTIONS', '20')), max_keepalive_connections=int(os.getenv('BAMBOO_MAX_CONNECTIONS', '20')), keepalive_expiry=60)
+        self._client: httpx.AsyncClient | None = None
+        self.csrf_ttl = float(os.getenv('BAMBOO_CSRF_TTL', '1800'))
+        self._csrf_tokens: dict[str, tuple[str, float]] = {}  # PHPSESSID -> (token, expires at, monotonic)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                follow_redirects=True,
+                # never keep cookies between requests, the pool is shared by all users
+                cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            )
+        return self._client
+
+    async def request(self, method: str, url: str, phpsessid: str, **kwargs) -> httpx.Response:
+        headers = {"Cookie": f"PHPSESSID={phpsessid}", **kwargs.pop('headers', {})}
+        (breaker := circuit(self.base_url)).check()
+        endpoint = re.sub(r'^(/timesheet/clock/\w+)/.*', r'\1', url)  # one histogram per endpoint, not per employee id
+        with timed(f"bamboo:{method}:{endpoint}") as call:
+            try:
+                r = await self.client.request(method, url, headers=headers, **kwargs)
+            except httpx.TransportError:
+                breaker.failure()
+                raise
+            call['status'] = r.status_code
+            call['error'] = self.is_host_failure(r)
+        breaker.failure() if self.is_host_failure(r) else breaker.success()
+        return r
+
+    @staticmethod
+    def is_host_failure(r: httpx.Response) -> bool:
+        """Bamboo HR (or a proxy in front of it) is down or throttling, says nothing about the session"""
+        return r.status_code >= 500 or r.status_code == 429
+
+    @staticmethod
+    def is_session_rejected(r: httpx.Response) -> bool:
+        """A dead PHPSESSID is answered with 401/403, or a redirect to (or the page of) the login form"""
+        if r.status_code in (401, 403):
+            return True
+        return r.status_code < 400 and (bool(r.history) or 'login' in r.url.path.lower() or ('html' in r.headers.get('content-type', '') and re.search(r'log\s?in', r.text, re.I) is not None))
+
+    async def time_tracking(self, phpsessid: str) -> httpx.Response:
+        return await self.request("GET", "/widget/timeTracking", phpsessid)
+
+    async def home(self, phpsessid: str) -> str:
+        return (await self.request("GET", "/home", phpsessid)).text
+
+    async def clock(self, phpsessid: str, in_out: str, employee_id, csrf_token: str) -> httpx.Response:
+        return await self.request("POST", f"/timesheet/clock/{in_out}/{employee_id}", phpsessid, headers={"x-csrf-token": csrf_token})
+
+    def cached_csrf_token(self, phpsessid: str, min_ttl: float = 0) -> str | None:
+        """Cached token still valid for at least min_ttl seconds"""
+        if (cached := self._csrf_tokens.get(phpsessid)) and cached[1] > time.monotonic() + min_ttl:
+            return cached[0]
+        return None
+
+    async def csrf_token(self, phpsessid: str, refresh: bool = False) -> str:
+        """CSRF token of the session, the /home page is only downloaded on a cache miss or when refresh is requested"""
+        if not refresh and (token := self.cached_csrf_token(phpsessid)):
+            return token
+        self._csrf_tokens.pop(phpsessid, None)
+        if not (m := re.search(r'var\s+CSRF_TOKEN\s*=\s*"([a-f0-9]{128})"', await self.home(phpsessid))):
+            raise ValueError("CSRF token not found, PHPSESSID is invalid/expired")
+        now = time.monotonic()
+        self._csrf_tokens = {k: v for k, v in self._csrf_tokens.items() if v[1] > now}
+        self._csrf_tokens[phpsessid] = (m.group(1), now + self.csrf_ttl)
+        return m.group(1)
+
+    @staticmethod
+    def is_csrf_failure(r: httpx.Response) -> bool:
+        return r.status_code == 403 or (r.status_code in (400, 419) and 'csrf' in r.text.lower())
+
+    async def clock_in_out(self, phpsessid: str, in_out: str, employee_id) -> httpx.Response:
+        """Clock with the cached CSRF token, on a 403/CSRF failure the token is refreshed and the POST retried once"""
+        r = await self.clock(phpsessid, in_out, employee_id, await self.csrf_token(phpsessid))
+        if self.is_csrf_failure(r):
+            r = await self.clock(phpsessid, in_out, employee_id, await self.csrf_token(phpsessid, refresh=True))
+        return r
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+bamboo = BambooClient()
+
+def credential_fingerprint(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:16]
+
+def credentials_rejected(s: dict, integration: str) -> bool:
+    """Credentials the integration already rejected are not tried again until the user sets new ones"""
+    value = s.get({'bamboo': 'bamboo_phpsessid', 'jira': 'jira_credentials'}[integration])
+    return bool(value) and (s.get('rejected_credentials') or {}).get(integration) == credential_fingerprint(value)
+
+async def reject_credentials(user_id, integration: str, value: str):
+    """Remember the credentials as bad and tell the user, once per credentials"""
+    async with user_lock(user_id):
+        if not (s := subscriber(user_id)) or s.get({'bamboo': 'bamboo_phpsessid', 'jira': 'jira_credentials'}[integration]) != value or credentials_rejected(s, integration):
+            return
+        s['rejected_credentials'] = {**(s.get('rejected_credentials') or {}), integration: credential_fingerprint(value)}
+        save_subscriber(s)
+    refreshes.reschedule(user_id)
+    text = {
+        'bamboo': "⚠️ Your Bamboo HR PHPSESSID is invalid or expired. Bamboo HR is not refreshed until you /set_bamboo_phpsessid again.",
+        'jira': "⚠️ Jira rejected your credentials. Jira is not refreshed until you /set_jira_credentials again.",
+    }[integration]
+    action, event = next_reminder(s, now := datetime.now(timezone.utc))
+    if integration == 'bamboo' and event and event - now < timedelta(days=1):
+        text += f"\n\nSet a new one before {action_label(action)} at {event.astimezone(zone(s.get('timezone', 'UTC'))):%H:%M}, or clocking in Bamboo HR will fail."
+    priority = outbound_priority.set(PRIORITY_REMINDER)
+    try:
+        await bot.send_message(user_id, text)
+    except Exception as e:
+        logger.warning(f"Could not notify {user_id} about rejected {integration} credentials: {e!r}")
+    finally:
+        outbound_priority.reset(priority)
+
+async def set_credentials(user_id, integration: str, fields: dict) -> dict | None:
+    """Write the integration's (new, same or no) credentials, a previous rejection is dropped so they are tried again"""
+    async with user_lock(user_id):
+        if not (s := subscriber(user_id)):
+            return None
+        s.update(fields)
+        if integration in (rejected := s.get('rejected_credentials') or {}):
+            s['rejected_credentials'] = {k: v for k, v in rejected.items() if k != integration}
+        save_subscriber(s)
+    refreshes.reschedule(user_id)
+    return s
+
+def json_or_none(r: httpx.Response):
+    try:
+        return r.json()
+    except ValueError:
+        return None
+
+async def update_bamboo_status(user: dict):
+    if (t := user.get('bamboo_phpsessid')) and not credentials_rejected(user, 'bamboo'):
         try:
-            user['bamboo_status'] = r.json()
-        except:
-            user['bamboo_status'] = {'error': 'PHPSESSID is invalid/expired'}
-        json.dump(user, open(f'subscribers/{user['id']}.json', "w"), indent=2, ensure_ascii=False)
+            r = await bamboo.time_tracking(t)
+        except CircuitOpenError:
+            return  # keep the last known status, Bamboo HR is down
+        except httpx.HTTPError as e:
+            status = {**(user.get('bamboo_status') or {}), 'error': f"Bamboo HR request failed: {e!r}"}
+        else:
+            if bamboo.is_host_failure(r):
+                return  # keep the last known status, only the circuit breaker counts it
+            if bamboo.is_session_rejected(r):
+                # keep employeeId and the last clock entries, only flag the session
+                status = {**(user.get('bamboo_status') or {}), 'error': 'PHPSESSID is invalid/expired'}
+                await reject_credentials(user['id'], 'bamboo', t)
+            elif not isinstance(status := json_or_none(r), dict):
+                status = {**(user.get('bamboo_status') or {}), 'error': f"Unexpected Bamboo HR response (HTTP {r.status_code})"}
+            else:
+                # pre-warm the CSRF token so a clock action is a single POST, but only when a fresh token lives until the
+                # next clock event (plus a repeat reminder), a plain keep-alive stays a single /widget/timeTracking GET
+                _, event = next_reminder(user, datetime.now(timezone.utc))
+                lead = (event - datetime.now(timezone.utc)).total_seconds() + REMINDER_INTERVAL if event else None
+                if lead is not None and lead < bamboo.csrf_ttl and not bamboo.cached_csrf_token(t, min_ttl=lead):
+                    try:
+                        await bamboo.csrf_token(t)
+                    except Exception as e:
+                        logger.warning(f"Could not pre-warm Bamboo HR CSRF token for {user['id']}: {e!r}")
+        await merge_subscriber(user['id'], {'bamboo_status': status, 'bamboo_refreshed_at': datetime.now(timezone.utc).isoformat()}, expect={'bamboo_phpsessid': t})
         
-def bamboo_clock_in_out(user: dict, action: str) -> bool:
+async def bamboo_clock_in_out(user: dict, action: str) -> bool:
     try:
         if t := user.get('bamboo_phpsessid'):
-            s = requests.Session()
-            s.cookies.update({"PHPSESSID": t})
-            csrf_token = re.search(r'var\s+CSRF_TOKEN\s*=\s*"([a-f0-9]{128})"', s.get("https://knowledgecity.bamboohr.com/home").text).group(1)
             in_out = "in" if action.lower().endswith("in") else "out"
             employee_id = user.get('bamboo_status', {}).get('employeeId')
-            r = s.post(f"https://knowledgecity.bamboohr.com/timesheet/clock/{in_out}/{employee_id}", headers={"x-csrf-token": csrf_token})
-            update_bamboo_status(user)
+            r = await bamboo.clock_in_out(t, in_out, employee_id)
+            await update_bamboo_status(user)
             return r.status_code == 200
     except Exception as e:
-        user['bamboo_status'] = {'error': f"Error clocking in/out in Bamboo HR: {e}"}
-        json.dump(user, open(f'subscribers/{user['id']}.json', "w"), indent=2, ensure_ascii=False)
+        await merge_subscriber(user['id'], {'bamboo_status': {'error': f"Error clocking in/out in Bamboo HR: {e}"}})
         return False
     return True
   
@@ -306,31 +1157,217 @@ def get_jira_credentials(user: dict) -> tuple[str, str]:
         return [j.split(',')[0].strip(), j.split(',')[1].strip()]
     return None
 
-def update_jira_status(user: dict):
-    if jira_credentials := get_jira_credentials(user):
-        jira_status = []
+class JiraExecutor:
+    """
+    Size-limited thread pool for the blocking jira library, every call gets a timeout so a slow Atlassian response
+    only holds up its caller. Queue depth and queue wait times are kept for sizing JIRA_MAX_WORKERS.
+    """
+    def __init__(self, max_workers: int = int(os.getenv('JIRA_MAX_WORKERS', '8')), timeout: float = float(os.getenv('JIRA_CALL_TIMEOUT', '30'))):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix='jira')
+        self._lock = threading.Lock()
+        self.queued = 0  # submitted, waiting for a free worker
+        self.running = 0
+        self.stats = {"calls": 0, "timeouts": 0, "errors": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+        self.waits = LatencyHistogram()
+
+    async def run(self, fn, *args, timeout: float | None = None, **kwargs):
+        (breaker := circuit(os.getenv('JIRA_SERVER', 'jira'))).check()
+        # queue wait included, that is what the caller waits for
+        with timed(f"jira:{getattr(fn, '__name__', 'call')}"):
+            return await self._run(breaker, fn, *args, timeout=timeout, **kwargs)
+
+    async def _run(self, breaker: CircuitBreaker, fn, *args, timeout: float | None = None, **kwargs):
+        submitted = time.monotonic()
+        def call():
+            wait = time.monotonic() - submitted
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.stats["wait_seconds_total"] += wait
+                self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], wait)
+                self.waits.observe(wait)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+        with self._lock:
+            self.queued += 1
+            self.stats["calls"] += 1
+        future = self._pool.submit(call)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            breaker.failure()
+            if future.cancel():  # never started, call() won't run to take it off the queue
+                with self._lock:
+                    self.queued -= 1
+            raise TimeoutError(f"Jira call {getattr(fn, '__name__', fn)} timed out after {timeout or self.timeout}s")
+        except Exception as e:
+            self.stats["errors"] += 1
+            # requests' connection errors are OSErrors, a 4xx JIRAError means Jira itself answered
+            breaker.failure() if isinstance(e, OSError) or (isinstance(e, JIRAError) and (e.status_code or 0) >= 500) else breaker.success()
+            raise
+        breaker.success()
+        return result
+
+    def submit(self, fn, *args):
+        """Fire and forget on the pool (e.g. closing a client): no timeout, no circuit breaker, errors are only logged"""
+        def call():
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception(f"Jira background call {getattr(fn, '__name__', fn)} failed")
+        self._pool.submit(call)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+jira_executor = JiraExecutor()
+
+def new_jira_client(jira_credentials) -> JIRA:
+    return JIRA(os.getenv('JIRA_SERVER'), basic_auth=tuple(jira_credentials), timeout=jira_executor.timeout)
+
+class JiraClientCache:
+    """
+    Authenticated JIRA clients keyed by a hash of the credentials, so the connection pool and the server-info handshake
+    are paid once per user instead of on every refresh. LRU-bounded, idle clients are dropped after idle_ttl seconds.
+    Dropped clients are closed on the Jira pool, those still leased once their last lease ends.
+    """
+    def __init__(self, max_size: int = int(os.getenv('JIRA_CLIENT_CACHE_SIZE', '256')), idle_ttl: float = float(os.getenv('JIRA_CLIENT_IDLE_TTL', '1800'))):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._clients: OrderedDict[str, tuple[JIRA, float]] = OrderedDict()  # least recently used first
+        self._pending: dict[str, asyncio.Task] = {}
+        self._leases: dict[JIRA, int] = {}
+        self._retired: set[JIRA] = set()  # dropped while leased, closed on release
+
+    @staticmethod
+    def key(jira_credentials) -> str:
+        jemail, jtoken = jira_credentials
+        return hashlib.sha256(f"{jemail.strip().lower()},{jtoken.strip()}".encode()).hexdigest()
+
+    def expire(self):
+        """Close the clients idle for idle_ttl seconds, on every get() and on the refresh/worker loop ticks"""
+        now = time.monotonic()
+        while self._clients and next(iter(self._clients.values()))[1] + self.idle_ttl < now:
+            self._close(self._clients.popitem(last=False)[1][0])
+
+    async def get(self, jira_credentials) -> JIRA:
+        self.expire()
+        if (key := self.key(jira_credentials)) in self._clients:
+            self._clients[key] = (self._clients[key][0], time.monotonic())
+            self._clients.move_to_end(key)
+            return self._clients[key][0]
+        if (task := self._pending.get(key)) is None:
+            self._pending[key] = task = asyncio.ensure_future(jira_executor.run(new_jira_client, jira_credentials))
+            task.add_done_callback(lambda t: self._pending.pop(key, None))
+        client = await asyncio.shield(task)
+        self._clients[key] = (client, time.monotonic())
+        self._clients.move_to_end(key)
+        while len(self._clients) > self.max_size:
+            self._close(self._clients.popitem(last=False)[1][0])
+        return client
+
+    def evict(self, jira_credentials):
+        if jira_credentials and (entry := self._clients.pop(self.key(jira_credentials), None)):
+            self._close(entry[0])
+
+    @contextlib.asynccontextmanager
+    async def lease(self, jira_credentials):
+        """The cached client for the credentials, not closed before the block ends even if it gets dropped meanwhile"""
+        client = await self.get(jira_credentials)
+        self._leases[client] = self._leases.get(client, 0) + 1
         try:
-            jemail, jtoken = jira_credentials
-            jira = JIRA(os.getenv('JIRA_SERVER'), basic_auth=tuple(jira_credentials))
-            jql_query = f'''issuekey IN updatedBy("{jemail.strip()}", "-3d") ORDER BY created DESC'''
-            issues = jira.search_issues(jql_query, maxResults=1000, fields='summary,updated,comment')  # Increase maxResults as needed
-            tz = ZoneInfo(user.get('timezone', 'UTC'))
-            for issue in issues:
-                for wl in sorted(jira.worklogs(issue.key) or [], key=lambda w: w.started or w.created, reverse=True):
-                    d = datetime.fromisoformat(wl.started or wl.created).astimezone(tz)
-                    if d.date() >= datetime.now().astimezone(tz).date() - timedelta(days=2):
-                        if wl.raw['author'].get('emailAddress', '').lower() == jemail.strip().lower() and (wl.timeSpent or "0m") != "0m":
-                            jira_status.append({
-                                "issue_key": issue.key,
-                                "time_spent": wl.timeSpent or "0m",
-                                "time_spent_seconds": wl.timeSpentSeconds or 0,
-                                "comment": wl.raw.get('comment', '').strip(),
-                                "date": d.isoformat(),
-                            })
+            yield client
+        finally:
+            if (n := self._leases.pop(client) - 1):
+                self._leases[client] = n
+            elif client in self._retired:
+                self._retired.discard(client)
+                jira_executor.submit(client.close)
+
+    def _close(self, client: JIRA):
+        # close() drops the client's session, a caller still using it would fail
+        if client in self._leases:
+            self._retired.add(client)
+        else:
+            jira_executor.submit(client.close)
+
+    def evict_on_auth_failure(self, jira_credentials, e: Exception):
+        if jira_auth_failure(e):
+            self.evict(jira_credentials)
+
+def jira_auth_failure(e: Exception) -> bool:
+    return isinstance(e, JIRAError) and e.status_code in (401, 403)
+
+jira_clients = JiraClientCache()
+
+async def jira_worklog_issues(jira: JIRA, horizon: datetime) -> dict[str, tuple[str, str]]:
+    """Issues the user logged work on since the horizon, issue id -> (key, updated), all pages of one JQL search"""
+    issues = await jira_executor.run(jira.search_issues, f'worklogAuthor = currentUser() AND worklogDate >= "{horizon:%Y-%m-%d}"', fields='updated', maxResults=False)
+    return {str(issue.id): (issue.key, issue.fields.updated) for issue in issues}
+
+def jira_worklog_entry(wl: dict, issue_key: str, tz: ZoneInfo) -> dict:
+    return {
+        "worklog_id": str(wl['id']),
+        "issue_key": issue_key,
+        "time_spent": wl.get('timeSpent') or "0m",
+        "time_spent_seconds": wl.get('timeSpentSeconds') or 0,
+        "comment": (wl.get('comment') or '').strip(),
+        "date": datetime.fromisoformat(wl.get('started') or wl.get('created')).astimezone(tz).isoformat(),
+    }
+
+def merge_jira_worklog(user: dict, wl: dict, issue_key: str):
+    """Put a worklog we created ourselves into jira_status right away, the next sync refetches its issue anyway"""
+    entry = jira_worklog_entry(wl, issue_key, ZoneInfo(user.get('timezone', 'UTC')))
+    user['jira_status'] = sorted([e for e in user.get('jira_status') or [] if e.get('worklog_id') != entry['worklog_id']] + [entry], key=lambda x: x['date'], reverse=True)
+
+async def sync_jira_worklogs(user: dict) -> dict:
+    """
+    Incremental sync, scoped to the user: one JQL search lists the issues they logged work on within the horizon with
+    their last update time, and only issues that are new or were updated since the last sync (adding, editing or deleting
+    a worklog updates the issue) get their worklogs fetched. Nothing changed costs the search request alone.
+    Returns the new jira_status/jira_sync fields without touching the user dict, every Jira call goes through jira_executor.
+    """
+    if (jira_credentials := get_jira_credentials(user)) and not credentials_rejected(user, 'jira'):
+        jemail, jtoken = jira_credentials
+        tz = ZoneInfo(user.get('timezone', 'UTC'))
+        horizon = datetime.combine(datetime.now(tz).date() - timedelta(days=2), datetime.min.time(), tzinfo=tz)
+        sync = dict(user.get('jira_sync') or {})
+        entries = [e for e in user.get('jira_status') or [] if e.get('worklog_id')]
+        if sync.get('email') != jemail.lower() or 'issues' not in sync:
+            sync, entries = {'email': jemail.lower(), 'issues': {}}, []
+        error = None
+        try:
+            async with jira_clients.lease(jira_credentials) as jira:
+                issues = await jira_worklog_issues(jira, horizon)
+                changed = {issue_id: key for issue_id, (key, updated) in issues.items() if sync['issues'].get(issue_id) != updated}
+                current_keys = {key for key, _ in issues.values()}
+                entries = [e for e in entries if e['issue_key'] in current_keys and e['issue_key'] not in changed.values()]
+                for issue_id, key in changed.items():
+                    for wl in await jira_executor.run(jira.worklogs, issue_id):
+                        wl = wl.raw
+                        if (wl.get('author') or {}).get('emailAddress', '').lower() == jemail.lower() and (wl.get('timeSpent') or "0m") != "0m":
+                            entries.append(jira_worklog_entry(wl, key, tz))
+            sync['issues'] = {issue_id: updated for issue_id, (key, updated) in issues.items()}
+        except CircuitOpenError:
+            return {}  # keep the last known worklogs, Jira is down
         except Exception as e:
-            jira_status.append({"comment": f"❌ Error fetching jira worklogs: {e}", "date": datetime.now(ZoneInfo(user.get('timezone', 'UTC'))).isoformat()})
-        user['jira_status'] = sorted(jira_status, key=lambda x: x['date'], reverse=True)
-        json.dump(user, open(f'subscribers/{user['id']}.json', "w"), indent=2, ensure_ascii=False)
+            jira_clients.evict_on_auth_failure(jira_credentials, e)
+            if jira_auth_failure(e):
+                await reject_credentials(user['id'], 'jira', user['jira_credentials'])
+            error = {"issue_key": "❌", "time_spent": "0m", "time_spent_seconds": 0, "comment": f"Error fetching jira worklogs: {e}", "date": datetime.now(tz).isoformat()}
+        jira_status = [e for e in entries if datetime.fromisoformat(e['date']) >= horizon] + ([error] if error else [])
+        return {'jira_status': sorted(jira_status, key=lambda x: x['date'], reverse=True), 'jira_sync': sync, 'jira_refreshed_at': datetime.now(timezone.utc).isoformat()}
+    return {}
+
+async def update_jira_status(user: dict):
+    if fields := await sync_jira_worklogs({k: user.get(k) for k in ('id', 'timezone', 'jira_credentials', 'jira_status', 'jira_sync', 'rejected_credentials') if k in user}):
+        await merge_subscriber(user['id'], fields, expect={'jira_credentials': user.get('jira_credentials')})
    
             
 @dp.callback_query(lambda c: c.data and c.data.startswith("action_"))
@@ -346,18 +1383,20 @@ async def callback_action_handler(callback: CallbackQuery) -> None:
     if action in ["dayin", "dayout", "lunchin", "lunchout"]:
         loading_msg = await message.answer(f"⏳ Processing {action.upper().replace('IN', ' IN').replace('OUT', ' OUT')}...")
         
-        if not bamboo_clock_in_out(s, action):
-            await loading_msg.edit_text(f"{my_info(user_id)}", parse_mode='HTML')
+        if not await bamboo_clock_in_out(s, action):
+            await send_my_info(user_id, loading_msg, edit=True)
             await message.answer("❌ Failed to clock in/out in Bamboo HR. Check Bamboo HR Log in /my_info.", parse_mode='HTML')
             return
         
-        s = json.load(open(f'subscribers/{user_id}.json'))
-        s['log'][action] = datetime.now(timezone.utc).isoformat()
-        json.dump(s, open(f'subscribers/{user_id}.json', "w"), indent=2, ensure_ascii=False)
+        async with user_lock(user_id):
+            s = subscriber(user_id)
+            s['log'][action] = datetime.now(timezone.utc).isoformat()
+            save_subscriber(s)
+        reminders.reschedule(user_id)
         
         await callback.answer(f"✅ {action.upper().replace('IN', ' IN').replace('OUT', ' OUT')} logged!", show_alert=False)
         
-        await loading_msg.edit_text(f"{my_info(user_id)}", parse_mode='HTML')
+        await send_my_info(user_id, loading_msg, edit=True)
         await message.answer(f"✅ {action.upper().replace('IN', ' IN').replace('OUT', ' OUT')} successfully logged!", parse_mode='HTML')
         if not s.get('bamboo_phpsessid'):
             await message.answer(f"⚠️ Don't forget to do the same in <b>Bamboo HR</b>!", parse_mode='HTML')
@@ -378,33 +1417,34 @@ async def command_action_handler(message: Message, command: CommandObject) -> No
         #     await message.answer(f"ℹ️ ✅ You've already clocked {cmd.upper()} today at <code>{datetime.fromisoformat(s.get('log', {}).get(cmd, '2000-01-01T09:00:00+00:00')).astimezone(ZoneInfo(s['timezone'])).strftime('%H:%M:%S')}</code>.", parse_mode='HTML')
         #     await message.answer(f"⚠️ Don't forget to do the same in <b>Bamboo HR</b>!", parse_mode='HTML')
         #     return
-        if not bamboo_clock_in_out(s, cmd):
-            await loading_msg.edit_text(f"{my_info(user_id)}", parse_mode='HTML')
+        if not await bamboo_clock_in_out(s, cmd):
+            await send_my_info(user_id, loading_msg, edit=True)
             await message.answer("❌ Failed to clock in/out in Bamboo HR. Check Bamboo HR Log in /my_info.", parse_mode='HTML')
             return
-        s = json.load(open(f'subscribers/{user_id}.json'))
-        s['log'][cmd] = datetime.now(timezone.utc).isoformat()
-        json.dump(s, open(f'subscribers/{user_id}.json', "w"), indent=2, ensure_ascii=False)
-        await loading_msg.edit_text(f"{my_info(user_id)}", parse_mode='HTML')
+        async with user_lock(user_id):
+            s = subscriber(user_id)
+            s['log'][cmd] = datetime.now(timezone.utc).isoformat()
+            save_subscriber(s)
+        reminders.reschedule(user_id)
+        await send_my_info(user_id, loading_msg, edit=True)
         await message.answer(f"✅ {cmd.upper().replace('IN', ' IN').replace('OUT', ' OUT')} successfully logged!", parse_mode='HTML')
         if not s.get('bamboo_phpsessid'):
             await message.answer(f"⚠️ Don't forget to do the same in <b>Bamboo HR</b>!", parse_mode='HTML')
         return
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    await send_my_info(user_id, message)
     
 @dp.message(Command("reset_day"))
 async def command_reset_day_handler(message: Message) -> None:
     user_id = message.from_user.id
-    s = subscriber(user_id)
-    s['log'] = {
+    await merge_subscriber(user_id, {'log': {
         "dayin": "2000-01-01T09:00:00+00:00",
         "lunchout": "2000-01-01T13:00:00+00:00",
         "lunchin": "2000-01-01T14:00:00+00:00",
         "dayout": "2000-01-01T20:30:00+00:00"
-    }
-    json.dump(s, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
+    }})
+    reminders.reschedule(user_id)
     await message.answer(f"✅ Daily log reseted!")
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    await send_my_info(user_id, message)
     
 @dp.message(Command("my_info"))
 async def command_my_info_handler(message: Message) -> None:
@@ -412,10 +1452,7 @@ async def command_my_info_handler(message: Message) -> None:
         await message.answer("❌ You're not subscribed! Please /subscribe first.")
         return
     
-    loading_msg = await message.answer("⏳ Loading your info...")
-    update_bamboo_status(s)
-    update_jira_status(s)
-    await loading_msg.edit_text(f"{my_info(user_id)}", parse_mode='HTML')
+    await send_my_info(user_id, message, force_refresh=True)
     
 @dp.message(Command("subscribe", "follow"))
 async def command_subscribe_handler(message: Message, state: FSMContext) -> None:
@@ -478,14 +1515,14 @@ def is_valid_timezone(tz_name: str) -> bool:
 @dp.message(SubscribeStates.waiting_for_timezone)
 async def process_timezone_handler(message: Message, state: FSMContext) -> None:
     await state.clear()
-    s = subscriber(user_id := message.from_user.id)
+    user_id = message.from_user.id
     if not is_valid_timezone(message.text.strip()):
         await message.answer("❌ Invalid timezone. Please enter a valid timezone (e.g: 'Asia/Dubai').")
         return
-    s['timezone'] = message.text.strip()
-    json.dump(s, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
+    await merge_subscriber(user_id, {'timezone': message.text.strip()})
+    reminders.reschedule(user_id)
     await message.answer(f"✅ Timezone set to {message.text.strip()}")
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    await send_my_info(user_id, message)
     
 @dp.message(Command("set_bamboo_phpsessid"))
 async def command_set_bamboo_phpsessid_handler(message: Message, state: FSMContext) -> None:
@@ -511,14 +1548,13 @@ async def command_set_bamboo_phpsessid_handler(message: Message, state: FSMConte
 @dp.message(SubscribeStates.waiting_for_bamboo_phpsessid)
 async def process_bamboo_phpsessid_handler(message: Message, state: FSMContext) -> None:
     await state.clear()
-    s = subscriber(user_id := message.from_user.id)
+    user_id = message.from_user.id
     if not message.text or not message.text.strip():
-        await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+        await send_my_info(user_id, message)
         await message.answer("❌ Action aborted.")
         return
-    s['bamboo_phpsessid'] = message.text.strip()
-    json.dump(s, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    await set_credentials(user_id, 'bamboo', {'bamboo_phpsessid': message.text.strip()})
+    await send_my_info(user_id, message)
     await message.answer(f"✅ Bamboo HR PHPSESSID set successfully!")
     
 @dp.message(Command("unset_bamboo_phpsessid"))
@@ -527,9 +1563,8 @@ async def command_unset_bamboo_phpsessid_handler(message: Message, state: FSMCon
         await message.answer("❌ You're not subscribed! Please /subscribe first.")
         return
     await state.clear()
-    s['bamboo_phpsessid'] = None
-    json.dump(s, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    await set_credentials(user_id, 'bamboo', {'bamboo_phpsessid': None})
+    await send_my_info(user_id, message)
     await message.answer(f"✅ Bamboo HR PHPSESSID unset successfully!")
     
 @dp.message(Command("set_jira_credentials"))
@@ -556,9 +1591,9 @@ async def process_jira_credentials_handler(message: Message, state: FSMContext)
     if len(message.text.strip().split(',')) != 2:
         await message.answer("❌ Invalid Jira credentials. Please enter a valid email and api_token in the format email,api_token.")
         return
-    s['jira_credentials'] = message.text.strip()
-    json.dump(s, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    jira_clients.evict(get_jira_credentials(s or {}))
+    await set_credentials(user_id, 'jira', {'jira_credentials': message.text.strip(), 'jira_sync': None})
+    await send_my_info(user_id, message)
     await message.answer(f"✅ Jira credentials set successfully!")
     
 @dp.message(Command("unset_jira_credentials"))
@@ -567,9 +1602,9 @@ async def command_unset_jira_credentials_handler(message: Message, state: FSMCon
         await message.answer("❌ You're not subscribed! Please /subscribe first.")
         return
     await state.clear()
-    s['jira_credentials'] = None
-    json.dump(s, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    jira_clients.evict(get_jira_credentials(s))
+    await set_credentials(user_id, 'jira', {'jira_credentials': None, 'jira_sync': None})
+    await send_my_info(user_id, message)
 
 @dp.message(Command("add_jira_worklog"))
 async def command_add_jira_worklog_handler(message: Message, state: FSMContext) -> None:
@@ -582,7 +1617,7 @@ async def command_add_jira_worklog_handler(message: Message, state: FSMContext)
     examples.append(f"<code>KC-456,{datetime.now(ZoneInfo(s.get('timezone', 'UTC'))).strftime('%H:%M')},1h 5m,Meeting with Alice & Bob</code> (note: date is today if not provided)")
     seen_issues = set()
     for i, jira_status in enumerate((s.get('jira_status') or [])):
-        if jira_status['issue_key'] in seen_issues:
+        if not jira_status.get('worklog_id') or jira_status['issue_key'] in seen_issues:
             continue
         seen_issues.add(jira_status['issue_key'])
         if len(examples) >= 6:
@@ -627,10 +1662,18 @@ async def process_jira_worklog_handler(message: Message, state: FSMContext) -> N
     except Exception as e:
         await message.answer(f"❌ Invalid started at format. Please enter a valid started at in the format yyyy-mm-dd hh:mm or in hh:mm format (e.g: 09:00). {e}")
         return
-    jira = JIRA(options={'server': os.getenv('JIRA_SERVER')}, basic_auth=tuple(jira_credentials))
-    jira.add_worklog(issue=issue_id, started=started_at, timeSpent=time_spent, comment=comment)
-    update_jira_status(subscriber(user_id))
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    try:
+        async with jira_clients.lease(jira_credentials) as jira:
+            wl = await jira_executor.run(jira.add_worklog, issue=issue_id, started=started_at, timeSpent=time_spent, comment=comment)
+    except Exception as e:
+        jira_clients.evict_on_auth_failure(jira_credentials, e)
+        await message.answer(f"❌ Failed to add Jira worklog: {e}")
+        return
+    async with user_lock(user_id):
+        if (s := subscriber(user_id)) and s.get('jira_credentials'):
+            merge_jira_worklog(s, wl.raw, issue_id.upper())
+            save_subscriber(s)
+    await send_my_info(user_id, message)
     await message.answer(f"✅ Jira worklog added successfully!")
    
 @dp.message(Command("set_daily_schedule"))
@@ -680,14 +1723,17 @@ async def process_daily_schedule_handler(message: Message, state: FSMContext) ->
         if not 1 <= week_day <= 7:
             await message.answer("❌ Invalid week day number. Please enter a number between 1 and 7. 1 is Monday, 7 is Sunday.")
             return
-        arr = s.get('weekly_schedule', [])
-        if len(arr) != 7:
-            arr = ['N/A' for i in range(7)]
-        arr[week_day - 1] = 'N/A'
-        s['weekly_schedule'] = arr
-        json.dump(s, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
+        async with user_lock(user_id):
+            s = subscriber(user_id)
+            arr = s.get('weekly_schedule', [])
+            if len(arr) != 7:
+                arr = ['N/A' for i in range(7)]
+            arr[week_day - 1] = 'N/A'
+            s['weekly_schedule'] = arr
+            save_subscriber(s)
+        reminders.reschedule(user_id)
         await message.answer(f"✅ Weekly schedule updated.")
-        await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+        await send_my_info(user_id, message)
         return
     week_day, day_in, lunch_out, day_out = message.text.split(',')
     if not 1 <= int(week_day := week_day.strip()) <= 7:
@@ -703,19 +1749,22 @@ async def process_daily_schedule_handler(message: Message, state: FSMContext) ->
     if not is_hh_mm(day_out := day_out.strip()):
         await message.answer("❌ Invalid day out time. Please enter a valid time in the format hh:mm.")
         return
-    arr = s.get('weekly_schedule', [])
-    if len(arr) != 7:
-        arr = ['N/A' for i in range(7)]
-    arr[week_day - 1] = f"{week_day},{day_in},{lunch_out},{day_out}"
-    s['weekly_schedule'] = arr
-    json.dump(s, open(f'subscribers/{message.from_user.id}.json', "w"), indent=2, ensure_ascii=False)
+    async with user_lock(user_id):
+        s = subscriber(user_id)
+        arr = s.get('weekly_schedule', [])
+        if len(arr) != 7:
+            arr = ['N/A' for i in range(7)]
+        arr[week_day - 1] = f"{week_day},{day_in},{lunch_out},{day_out}"
+        s['weekly_schedule'] = arr
+        save_subscriber(s)
+    reminders.reschedule(user_id)
     await message.answer(f"✅ Your updated weekly schedule is:\n{json.dumps(subscriber(message.from_user.id)['weekly_schedule'], indent=2, ensure_ascii=False)}\n\nSet another day with /set_daily_schedule")
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    await send_my_info(user_id, message)
        
 @dp.message(Command("unsubscribe", "unfollow"))
 async def command_unsubscribe_handler(message: Message) -> None:
-    if os.path.exists(f'subscribers/{message.from_user.id}.json'):
-        os.remove(f'subscribers/{message.from_user.id}.json')
+    if delete_subscriber(message.from_user.id):
+        reminders.reschedule(message.from_user.id)
         await message.answer("✅ You've unsubscribed from reminders!")
     else:
         await message.answer("❌ You're not subscribed! Please /subscribe first.")
@@ -733,7 +1782,7 @@ async def process_password_handler(message: Message, state: FSMContext) -> None:
     if password == os.getenv('SUBSCRIBER_PASSWORD'):
         logger.info(f"/subscribe from {message.from_user.full_name} ({message.from_user.id})")
         subscribe(message)
-        await message.answer(f"{my_info(message.from_user.id)}", parse_mode='HTML')
+        await send_my_info(message.from_user.id, message)
         await message.answer("✅ Password correct! You've subscribed to reminders!")
         await state.clear()
     else:
@@ -790,10 +1839,10 @@ async def process_pause_reminders_handler(message: Message, state: FSMContext) -
         await message.answer(f"❌ Invalid datetime format. Please enter a valid datetime in format 'YYYY-MM-DD HH:MM' or 'HH:MM'. Error: {e}")
         return
     
-    s['pause_reminders'] = stop_until.isoformat()
-    json.dump(s, open(f'subscribers/{user_id}.json', "w"), indent=2, ensure_ascii=False)
+    await merge_subscriber(user_id, {'pause_reminders': stop_until.isoformat()})
+    reminders.reschedule(user_id)
     await message.answer(f"✅ Reminders paused until {stop_until.strftime('%Y-%m-%d %H:%M')} ({tz.key})")
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    await send_my_info(user_id, message)
 
 @dp.message(Command("resume_reminders"))
 async def command_resume_reminders_handler(message: Message) -> None:
@@ -801,83 +1850,815 @@ async def command_resume_reminders_handler(message: Message) -> None:
         await message.answer("❌ You're not subscribed! Please /subscribe first.")
         return
     
-    if 'pause_reminders' in s:
-        del s['pause_reminders']
-        json.dump(s, open(f'subscribers/{user_id}.json', "w"), indent=2, ensure_ascii=False)
+    async with user_lock(user_id):
+        if resumed := 'pause_reminders' in (s := subscriber(user_id) or {}):
+            del s['pause_reminders']
+            save_subscriber(s)
+    if resumed:
+        reminders.reschedule(user_id)
         await message.answer("✅ Reminders resumed!")
     else:
         await message.answer("ℹ️ Reminders are already active.")
-    await message.answer(f"{my_info(user_id)}", parse_mode='HTML')
+    await send_my_info(user_id, message)
             
-bot = Bot(token=os.getenv("BOT_TOKEN"))
+PRIORITY_INTERACTIVE, PRIORITY_REMINDER = 0, 1
+outbound_priority: contextvars.ContextVar[int] = contextvars.ContextVar('outbound_priority', default=PRIORITY_INTERACTIVE)
 
-last_reminder_messages = {}
-async def check_reminders_loop():
-    while True:
-        for f in os.listdir('subscribers'):
-            if f.endswith('.json'):
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = burst, time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available, 0 means one was taken"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst and time.monotonic() >= self.blocked_until
+
+class OutboundDispatcher(BaseRequestMiddleware):
+    """
+    Session middleware every chat-bound Telegram request goes through: a global token bucket shared by all chats with
+    interactive replies served before reminders, a per-chat bucket and FIFO lock (messages to one chat keep their order),
+    and retry after TelegramRetryAfter. Time spent queued is kept per priority, requests not sent yet (blocked on the chat
+    lock, a bucket or the global queue) are counted in pending.
+    """
+    def __init__(self):
+        self.bucket = TokenBucket(float(os.getenv('TELEGRAM_GLOBAL_RATE', '25')), float(os.getenv('TELEGRAM_GLOBAL_BURST', '30')))
+        self.chat_rate = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+        self.chat_burst = float(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+        self.max_retries = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))
+        self.chats: dict[int | str, tuple[asyncio.Lock, TokenBucket]] = {}
+        self._waiting: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._pump_task: asyncio.Task | None = None
+        self.stats = {"requests": 0, "retry_after": 0, "retry_after_seconds_total": 0.0}
+        self.waits: dict[int, LatencyHistogram] = {PRIORITY_INTERACTIVE: LatencyHistogram(), PRIORITY_REMINDER: LatencyHistogram()}
+        self.pending = 0
+
+    def queued(self) -> int:
+        """Requests waiting for their first send, whether on the chat lock, the chat bucket or the global queue"""
+        return self.pending
+
+    def _chat(self, chat_id) -> tuple[asyncio.Lock, TokenBucket]:
+        if (chat := self.chats.get(chat_id)) is None:
+            if len(self.chats) > 1000:
+                self.chats = {k: v for k, v in self.chats.items() if v[0].locked() or not v[1].idle()}
+            chat = self.chats[chat_id] = (asyncio.Lock(), TokenBucket(self.chat_rate, self.chat_burst))
+        return chat
+
+    async def _pump(self):
+        while True:
+            while self._waiting and self._waiting[0][2].done():
+                heapq.heappop(self._waiting)
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if (wait := self.bucket.wait_time()) > 0:
+                await asyncio.sleep(wait)
+                continue
+            while self._waiting:
+                if not (future := heapq.heappop(self._waiting)[2]).done():
+                    future.set_result(None)
+                    break
+
+    async def _acquire_global(self, priority: int):
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    async def __call__(self, make_request, bot, method):
+        if (chat_id := getattr(method, 'chat_id', None)) is None:
+            with timed(f"telegram:{type(method).__name__}"):
+                return await make_request(bot, method)
+        priority = outbound_priority.get()
+        queued_at = time.monotonic()
+        lock, chat_bucket = self._chat(chat_id)
+        self.pending += 1
+        pending = True
+        try:
+            async with lock:
+                for attempt in range(self.max_retries + 1):
+                    while (wait := chat_bucket.wait_time()) > 0:
+                        await asyncio.sleep(wait)
+                    await self._acquire_global(priority)
+                    if pending:
+                        self.pending -= 1
+                        pending = False
+                        self.waits[priority].observe(time.monotonic() - queued_at)
+                    self.stats["requests"] += 1
+                    try:
+                        with timed(f"telegram:{type(method).__name__}"):
+                            return await make_request(bot, method)
+                    except TelegramRetryAfter as e:
+                        self.stats["retry_after"] += 1
+                        self.stats["retry_after_seconds_total"] += e.retry_after
+                        logger.warning(f"Telegram flood control on {type(method).__name__} to {chat_id}, retry in {e.retry_after}s")
+                        chat_bucket.blocked_until = time.monotonic() + e.retry_after
+                        if attempt == self.max_retries:
+                            raise
+        finally:
+            if pending:  # cancelled before it went out
+                self.pending -= 1
+
+outbound = OutboundDispatcher()
+# TELEGRAM_API_URL points the bot at a local Bot API server (or the fake one of benchmarks/fakes.py)
+bot = Bot(token=os.getenv("BOT_TOKEN"), session=AiohttpSession(api=TelegramAPIServer.from_base(url)) if (url := os.getenv('TELEGRAM_API_URL')) else None)
+bot.session.middleware(outbound)
+
+REMINDER_MODE = os.getenv('REMINDER_MODE', 'resend')  # resend: send a new one and delete the old, edit: update the pending reminder in place (silent)
+REMINDER_INTERVAL = float(os.getenv('REMINDER_INTERVAL', 60*5))
+REMINDER_CONCURRENCY = int(os.getenv('REMINDER_CONCURRENCY', '20'))
+REMINDER_USER_TIMEOUT = float(os.getenv('REMINDER_USER_TIMEOUT', '60'))
+REFRESH_INTERVAL = float(os.getenv('REFRESH_INTERVAL', 60*5))  # Bamboo HR/Jira staleness during the working day
+REFRESH_NEAR_TTL = float(os.getenv('REFRESH_NEAR_TTL', 60*2))  # ... around a scheduled or just done clock event
+REFRESH_NEAR_WINDOW = float(os.getenv('REFRESH_NEAR_WINDOW', 60*30))
+REFRESH_IDLE_TTL = float(os.getenv('REFRESH_IDLE_TTL', 60*60*6))  # ... otherwise (no schedule today, paused, off hours), 0 = only on demand
+REFRESH_JITTER = float(os.getenv('REFRESH_JITTER', '0.2'))
+BAMBOO_KEEPALIVE_INTERVAL = float(os.getenv('BAMBOO_KEEPALIVE_INTERVAL', 60*20))  # well under the Bamboo HR session idle lifetime
+BAMBOO_VALIDATE_LEAD = float(os.getenv('BAMBOO_VALIDATE_LEAD', 60*15))  # check the session this long before every clock event
+refresh_stats = {
+    "refreshes": 0,
+    "keepalives": 0,
+    "timeouts": 0,
+    "skipped": 0,
+    "last_refresh_at": None,
+}
+reminder_stats = {
+    "sent": dict.fromkeys(action_to_icon, 0),
+    "timeouts": 0,
+    "errors": 0,
+}
+reminder_delay = LatencyHistogram()  # due instant -> picked up by the scheduler
+loop_ticks: dict[str, float] = {}  # long running loop -> time.monotonic() of its last iteration, for /healthz
+
+def next_reminder(s: dict, now: datetime) -> tuple[str | None, datetime | None]:
+    """
+    Next reminder (action, UTC instant) for the subscriber, the instant is <= now when a reminder is due right away.
+    Schedule times are wall-clock times of the subscriber's timezone, so every day is resolved on its own date (DST safe).
+    An overdue reminder is repeated every REMINDER_INTERVAL seconds after the last one (s['last_reminder']).
+    """
+    last_reminder = s.get('last_reminder')
+    tz = ZoneInfo(s.get('timezone', 'UTC'))
+    start = now
+    if (stop_until_str := s.get('pause_reminders')) and (stop_until := datetime.fromisoformat(stop_until_str)) > now:
+        start = stop_until.astimezone(timezone.utc)
+    local_start = start.astimezone(tz)
+    log = {k: datetime.fromisoformat(v).astimezone(tz) for k, v in (s.get('log') or {}).items() if v}
+    for offset in range(8):
+        day = local_start.date() + timedelta(days=offset)
+        schedule = [a for a in s.get('weekly_schedule', []) if a and a.split(',')[0] == str(day.isoweekday())]
+        if not schedule:
+            continue
+        target_day_in, target_lunch_out, target_day_out = (datetime.combine(day, datetime.strptime(t.strip(), '%H:%M').time(), tzinfo=tz) for t in schedule[0].split(',')[1:])
+        done = {k for k, v in log.items() if v.date() == day}
+        if 'dayin' not in done:
+            action, due = 'dayin', target_day_in
+        elif 'lunchout' not in done:
+            action, due = 'lunchout', target_lunch_out
+        elif 'lunchin' not in done:
+            action, due = 'lunchin', log['lunchout'] + timedelta(hours=1)
+        elif 'dayout' not in done:
+            action, due = 'dayout', target_day_out
+        else:
+            continue
+        due = max(due.astimezone(timezone.utc), start)
+        if last_reminder and last_reminder.get('action') == action and (sent_at := last_reminder.get('sent_at')) and (sent_at := datetime.fromisoformat(sent_at)).astimezone(tz).date() == day:
+            due = max(due, sent_at + timedelta(seconds=REMINDER_INTERVAL))
+        # a reminder which is still pending at midnight is dropped, the next day starts over
+        if due.astimezone(tz).date() != day:
+            continue
+        return action, due
+    return None, None
+
+async def send_reminder(user_id: int):
+    outbound_priority.set(PRIORITY_REMINDER)
+    current_user_id.set(user_id)
+    s = None
+    try:
+        if not (s := subscriber(user_id)):
+            return
+        now = datetime.now(timezone.utc)
+        if (stop_until_str := s.get('pause_reminders')) and datetime.fromisoformat(stop_until_str) <= now:
+            # Pause period has passed, remove it
+            async with user_lock(user_id):
+                if s.get('pause_reminders') == stop_until_str:
+                    del s['pause_reminders']
+                    save_subscriber(s)
+        action, due = next_reminder(s, now)
+        if not action or due > now:
+            return
+        last = s.get('last_reminder') or {}
+        # a repeat of the same pending action today, not yesterday's reminder for the same action
+        repeat = last.get('action') == action and last.get('id') and datetime.fromisoformat(last['sent_at']).astimezone(tz := zone(s.get('timezone', 'UTC'))).date() == now.astimezone(tz).date()
+        count = last.get('count', 1) + 1 if repeat else 1
+        text = {
+            'dayin': f"Reminder: {action_to_icon['dayin']} Day IN! \n\n/pause_reminders",
+            'lunchout': f"Reminder: {action_to_icon['lunchout']} Lunch OUT! \n\n/pause_reminders",
+            'lunchin': f"Reminder: {action_to_icon['lunchin']} Lunch IN! \n\n/pause_reminders",
+            'dayout': f"Reminder: {action_to_icon['dayout']} Day OUT! \n\n/pause_reminders",
+        }[action]
+        if count > 1:
+            # edited text has to change, otherwise Telegram rejects the edit as "message is not modified"
+            text = text.replace("Reminder:", f"Reminder ({count}x):", 1)
+        message_id = None
+        if repeat and REMINDER_MODE == 'edit':
+            try:
+                await bot.edit_message_text(text, chat_id=user_id, message_id=last['id'], reply_markup=create_action_keyboard(action))
+                message_id = last['id']
+            except TelegramBadRequest as e:
+                # deleted by the user or too old to edit, send a new one
+                logger.info(f"Could not edit reminder {last['id']} for {user_id}: {e}")
+        if message_id is None:
+            message_id = (await bot.send_message(user_id, text, reply_markup=create_action_keyboard(action))).message_id
+            if repeat:
                 try:
-                    s = json.load(open(f'subscribers/{f}'))
-                    update_bamboo_status(s)
-                    update_jira_status(s)
-                    n = datetime.now(ZoneInfo(s.get('timezone', 'UTC')))
-                    
-                    # Check if reminders are paused
-                    if stop_until_str := s.get('pause_reminders'):
-                        stop_until = datetime.fromisoformat(stop_until_str).astimezone(ZoneInfo(s.get('timezone', 'UTC')))
-                        if n < stop_until:
-                            # Reminders are paused, skip this user
-                            continue
-                        else:
-                            # Pause period has passed, remove it
-                            if 'pause_reminders' in s:
-                                del s['pause_reminders']
-                                json.dump(s, open(f'subscribers/{f}', "w"), indent=2, ensure_ascii=False)
-                    
-                    week_day = n.isoweekday()
-                    past = n - timedelta(hours=48)
-                    ymd, hm =  n.strftime('%Y-%m-%d'), n.strftime('%H:%M')
-                    schedule = [a for a in s.get('weekly_schedule', []) if a and a.split(',')[0] == str(week_day)]
-                    if not schedule:
-                        continue
-                    target_day_in, target_lunch_out, target_day_out = schedule[0].split(',')[1:]
-                    log = s.get('log', {})
-                    has_dayin = datetime.fromisoformat(log.get('dayin', past.isoformat())).astimezone(ZoneInfo(s.get('timezone', 'UTC'))).strftime('%Y-%m-%d') == ymd
-                    has_lunchout = (lunchout :=datetime.fromisoformat(log.get('lunchout', past.isoformat()))).astimezone(ZoneInfo(s.get('timezone', 'UTC'))).strftime('%Y-%m-%d') == ymd
-                    has_lunchin = datetime.fromisoformat(log.get('lunchin', past.isoformat())).astimezone(ZoneInfo(s.get('timezone', 'UTC'))).strftime('%Y-%m-%d') == ymd
-                    has_dayout = datetime.fromisoformat(log.get('dayout', past.isoformat())).astimezone(ZoneInfo(s.get('timezone', 'UTC'))).strftime('%Y-%m-%d') == ymd
-                    message, action = None, None
-                    if not has_dayin and hm >= target_day_in.strip().lower():
-                        message = await bot.send_message(s['id'], f"Reminder: {action_to_icon['dayin']} Day IN! \n\n/pause_reminders", reply_markup=create_action_keyboard('dayin'))
-                        action = 'dayin'
-                    if has_dayin and not has_lunchout and hm >= target_lunch_out.strip().lower():
-                        message = await bot.send_message(s['id'], f"Reminder: {action_to_icon['lunchout']} Lunch OUT! \n\n/pause_reminders", reply_markup=create_action_keyboard('lunchout'))
-                        action = 'lunchout'
-                    if has_dayin and has_lunchout and not has_lunchin and lunchout + timedelta(hours=1) <= n:
-                        message = await bot.send_message(s['id'], f"Reminder: {action_to_icon['lunchin']} Lunch IN! \n\n/pause_reminders", reply_markup=create_action_keyboard('lunchin'))
-                        action = 'lunchin'
-                    if has_dayin and has_lunchin and has_lunchout and not has_dayout and hm >= target_day_out.strip().lower():
-                        message = await bot.send_message(s['id'], f"Reminder: {action_to_icon['dayout']} Day OUT! \n\n/pause_reminders", reply_markup=create_action_keyboard('dayout'))
-                        action = 'dayout'
-                    if message and action:
-                        if last_reminder_messages.get(f"{s['id']}") and last_reminder_messages[f"{s['id']}"].get('action') == action:
-                            await bot.delete_message(s['id'], last_reminder_messages[f"{s['id']}"].get('id'))
-                        last_reminder_messages[f"{s['id']}"] = {'id': message.message_id, 'action': action}
-                except TelegramForbiddenError as e:
-                    if os.path.exists(f'subscribers/{s['id']}.json'):
-                        os.remove(f'subscribers/{s['id']}.json')
-                        logger.error(f"Unsubscribed user due to blocking the bot {f}: {e}. {s}")
-                except Exception as e:
-                    traceback.print_exc()
-                    logger.error(f"Error checking reminders for {f}: {e}. {s}")
-                    
-        await asyncio.sleep(60*5)
+                    await bot.delete_message(user_id, last['id'])
+                except TelegramBadRequest:
+                    pass
+        await merge_subscriber(user_id, {'last_reminder': {'id': message_id, 'action': action, 'sent_at': now.isoformat(), 'count': count}})
+        reminder_stats["sent"][action] += 1
+    except TelegramForbiddenError as e:
+        if delete_subscriber(user_id):
+            logger.error(f"Unsubscribed user due to blocking the bot {user_id}: {e}. {s}")
+    except Exception as e:
+        reminder_stats["errors"] += 1
+        logger.exception(f"Error sending reminder to {user_id}: {e}. {s}")
+
+WORKER_MODE = os.getenv('WORKER_MODE', 'all')  # all: one process does everything, bot: Telegram updates only, worker: reminders and refreshes of a shard
+WORKER_HEARTBEAT = float(os.getenv('WORKER_HEARTBEAT', '5'))
+
+class WorkerPool:
+    """
+    Reminder/refresh workers splitting the subscribers between them. Every worker heartbeats a lease row in SQLite, the
+    longest running live worker is the coordinator: it expires dead leases and publishes the member list under a new epoch
+    whenever workers join or leave. A worker owns the user ids that rendezvous-hash highest to it under the published members,
+    so a membership change only moves the users of the worker that joined or left.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS workers (
+            worker_id TEXT PRIMARY KEY,
+            started_at REAL NOT NULL,
+            heartbeat_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS worker_assignment (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            epoch INTEGER NOT NULL,
+            members TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, mode: str = 'all', path: str = 'subscribers.sqlite3', worker_id: str | None = None, lease_ttl: float = 30):
+        self.mode = mode
+        self.path = path
+        self.worker_id = worker_id or f"{os.uname().nodename}:{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.started_at = time.time()
+        self.epoch = 0
+        self.members: list[str] = []
+        self.db: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA busy_timeout=5000")
+            self.db.executescript(self.schema)
+        return self.db
+
+    def owns(self, user_id) -> bool:
+        if self.mode != 'worker':
+            return self.mode == 'all'
+        return bool(self.members) and max(self.members, key=lambda w: hashlib.sha256(f"{w}:{user_id}".encode()).digest()) == self.worker_id
+
+    def heartbeat(self) -> bool:
+        """Renew the lease (and rebalance when coordinating), True when the published members changed"""
+        db, now = self._connect(), time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("INSERT INTO workers (worker_id, started_at, heartbeat_at) VALUES (?, ?, ?) ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                       (self.worker_id, self.started_at, now))
+            live = [r[0] for r in db.execute("SELECT worker_id FROM workers WHERE heartbeat_at >= ? ORDER BY started_at, worker_id", (now - self.lease_ttl,))]
+            row = db.execute("SELECT epoch, members FROM worker_assignment WHERE id = 1").fetchone()
+            epoch, members = (row[0], json.loads(row[1])) if row else (0, [])
+            if live[0] == self.worker_id and sorted(live) != members:
+                db.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - self.lease_ttl,))
+                epoch, members = epoch + 1, sorted(live)
+                db.execute("INSERT OR REPLACE INTO worker_assignment (id, epoch, members, updated_at) VALUES (1, ?, ?, ?)", (epoch, json.dumps(members), now))
+                logger.info(f"Worker {self.worker_id} rebalanced shards, epoch {epoch}: {members}")
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if epoch == self.epoch:
+            return False
+        self.epoch, self.members = epoch, members
+        return True
+
+    def leave(self):
+        if self.db is not None:
+            self.db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+
+workers = WorkerPool(WORKER_MODE, os.getenv('WORKER_DB', os.getenv('SUBSCRIBER_DB', 'subscribers.sqlite3')), os.getenv('WORKER_ID'), float(os.getenv('WORKER_LEASE_TTL', '30')))
+
+class ReminderScheduler:
+    """
+    Keeps the next reminder instant of every subscriber in a heap and sleeps until the earliest one is due.
+    Handlers call reschedule() whenever they change schedule, timezone, log or pause state. An attempt that failed or
+    timed out (no last_reminder written) is not repeated for the same action before REMINDER_INTERVAL seconds.
+    """
+    def __init__(self):
+        self._heap: list[tuple[datetime, int]] = []
+        self._due: dict[int, datetime] = {}
+        self._attempted: dict[int, tuple[str, datetime]] = {}  # last (action, instant) _fire() tried to send
+        self._firing: set[int] = set()  # rescheduled once their _fire() is done
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(REMINDER_CONCURRENCY)
+        self._tasks: set[asyncio.Task] = set()
+
+    def reschedule(self, user_id: int):
+        user_id = int(user_id)
+        # the refresh cadence follows the same schedule, log and pause state
+        refreshes.reschedule(user_id)
+        if not workers.owns(user_id):
+            self._due.pop(user_id, None)
+            return
+        if user_id in self._firing:
+            return
+        try:
+            action, due = next_reminder(s, datetime.now(timezone.utc)) if (s := subscriber(user_id)) else (None, None)
+        except Exception as e:
+            logger.error(f"Error scheduling reminders for {user_id}: {e}")
+            action, due = None, None
+        if (attempted := self._attempted.get(user_id)) and (attempted[0] != action or attempted[1] + timedelta(seconds=REMINDER_INTERVAL) <= (due or attempted[1])):
+            del self._attempted[user_id]  # a later action or past the interval anyway
+        elif attempted:
+            due = attempted[1] + timedelta(seconds=REMINDER_INTERVAL)
+        if due is None:
+            self._due.pop(user_id, None)
+            return
+        if self._due.get(user_id) != due:
+            self._due[user_id] = due
+            heapq.heappush(self._heap, (due, user_id))
+            self._wakeup.set()
+
+    def rebalance(self):
+        """Reschedule everyone after the worker shard changed, users now owned by another worker are dropped"""
+        for user_id in set(self._due) | set(subscribers.ids_with_schedule()):
+            self.reschedule(user_id)
+
+    def next_due(self, user_id: int) -> datetime | None:
+        return self._due.get(int(user_id))
+
+    async def _fire(self, user_id: int):
+        self._firing.add(user_id)
+        try:
+            async with self._semaphore:
+                if (s := subscriber(user_id)) and (action := next_reminder(s, now := datetime.now(timezone.utc))[0]):
+                    self._attempted[user_id] = (action, now)
+                await asyncio.wait_for(send_reminder(user_id), REMINDER_USER_TIMEOUT)
+        except TimeoutError:
+            reminder_stats["timeouts"] += 1
+            logger.warning(f"Sending reminder to {user_id} timed out after {REMINDER_USER_TIMEOUT}s")
+        finally:
+            self._firing.discard(user_id)
+            self.reschedule(user_id)
+
+    async def run(self):
+        for user_id in subscribers.ids_with_schedule():
+            self.reschedule(user_id)
+        while True:
+            loop_ticks['reminders'] = time.monotonic()
+            now = datetime.now(timezone.utc)
+            while self._heap and self._heap[0][0] <= now:
+                due, user_id = heapq.heappop(self._heap)
+                if self._due.get(user_id) != due:
+                    continue  # superseded by a later reschedule()
+                del self._due[user_id]
+                reminder_delay.observe((now - due).total_seconds())
+                task = asyncio.create_task(self._fire(user_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            self._wakeup.clear()
+            timeout = min((self._heap[0][0] - now).total_seconds(), 60) if self._heap else 60
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
+
+reminders = ReminderScheduler()
+
+async def refresh_subscriber(user_id: int):
+    try:
+        await asyncio.shield(start_refresh(user_id))
+    except Exception as e:
+        logger.exception(f"Error refreshing integrations for {user_id}: {e}. {subscriber(user_id)}")
+
+def refresh_due(s: dict, now: datetime, attempted: datetime | None = None) -> datetime | None:
+    """
+    When the Bamboo HR/Jira state of the subscriber should be refreshed next, None when it has no integration to refresh.
+    Every REFRESH_NEAR_TTL seconds within REFRESH_NEAR_WINDOW of a pending or just done clock event, every REFRESH_INTERVAL
+    seconds in between during the working day and every REFRESH_IDLE_TTL seconds otherwise. A stable per-user jitter
+    spreads users with the same schedule over the window.
+    """
+    if not any(s.get(credentials) and not credentials_rejected(s, integration) for integration, credentials in (('bamboo', 'bamboo_phpsessid'), ('jira', 'jira_credentials'))):
+        return None
+    jitter = int(hashlib.md5(str(s['id']).encode()).hexdigest()[:8], 16) / 0xffffffff
+    window = timedelta(seconds=REFRESH_NEAR_WINDOW)
+    times = [s.get(k) for k, integration, credentials in (('bamboo_refreshed_at', 'bamboo', 'bamboo_phpsessid'), ('jira_refreshed_at', 'jira', 'jira_credentials')) if s.get(credentials) and not credentials_rejected(s, integration)]
+    refreshed = min((datetime.fromisoformat(t) for t in times if t), default=None) if all(times) else None
+    if attempted and (refreshed is None or attempted > refreshed):
+        refreshed = attempted  # failed refreshes are not retried faster than the regular cadence
+    action, event = next_reminder(s, now)
+    paused = bool((p := s.get('pause_reminders')) and datetime.fromisoformat(p) > now)
+    clocked = max((datetime.fromisoformat(v) for v in (s.get('log') or {}).values() if v), default=None)
+    if not paused and ((event and event - window <= now) or (clocked and now - clocked <= window)):
+        ttl = REFRESH_NEAR_TTL
+    elif not paused and action in ('lunchout', 'lunchin', 'dayout') and event.astimezone(zone(s.get('timezone', 'UTC'))).date() == now.astimezone(zone(s.get('timezone', 'UTC'))).date():
+        ttl = REFRESH_INTERVAL
+    else:
+        ttl = REFRESH_IDLE_TTL
+    if refreshed is None:
+        due = now + timedelta(seconds=jitter * REFRESH_NEAR_TTL)
+    elif ttl:
+        due = refreshed + timedelta(seconds=ttl * (1 - REFRESH_JITTER * jitter))
+    else:
+        due = None
+    if event and ttl != REFRESH_NEAR_TTL:
+        # wake up when the next clock event gets near, spread over the first half of its window
+        near = event - window + window * jitter / 2
+        due = min(due, near) if due else near
+    return max(due, now) if due else None
+
+def bamboo_keepalive_due(s: dict, now: datetime, touched: datetime | None = None) -> datetime | None:
+    """
+    When the Bamboo HR session should be touched next: BAMBOO_KEEPALIVE_INTERVAL after the last request, and
+    BAMBOO_VALIDATE_LEAD before the next clock event so a dead session is reported before the user needs it.
+    """
+    if not s.get('bamboo_phpsessid') or credentials_rejected(s, 'bamboo'):
+        return None
+    last = datetime.fromisoformat(t) if (t := s.get('bamboo_refreshed_at')) else None
+    if touched and (last is None or touched > last):
+        last = touched
+    if last is None:
+        return now
+    due = last + timedelta(seconds=BAMBOO_KEEPALIVE_INTERVAL)
+    if (event := next_reminder(s, now)[1]) and (check := event - timedelta(seconds=BAMBOO_VALIDATE_LEAD)) > last:
+        due = min(due, check)
+    return max(due, now)
+
+class RefreshScheduler:
+    """
+    Refreshes Bamboo HR/Jira state of every subscriber on its own cadence (refresh_due), separate from the reminders.
+    /my_info refreshes on demand on top of this and pushes the next scheduled refresh back. In between, Bamboo HR
+    sessions get a lightweight keep-alive and a check ahead of every clock event (bamboo_keepalive_due).
+    """
+    def __init__(self):
+        self._heap: list[tuple[datetime, int]] = []
+        self._due: dict[int, datetime] = {}
+        self._attempted: dict[int, datetime] = {}
+        self._touched: dict[int, datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(REMINDER_CONCURRENCY)
+        self._tasks: set[asyncio.Task] = set()
+
+    def reschedule(self, user_id: int):
+        user_id = int(user_id)
+        if not workers.owns(user_id):
+            self._due.pop(user_id, None)
+            return
+        try:
+            now = datetime.now(timezone.utc)
+            due = min((d for d in (refresh_due(s, now, self._attempted.get(user_id)), bamboo_keepalive_due(s, now, self._touched.get(user_id))) if d), default=None) if (s := subscriber(user_id)) else None
+        except Exception as e:
+            logger.error(f"Error scheduling refresh for {user_id}: {e}")
+            due = None
+        if due is None:
+            self._due.pop(user_id, None)
+            return
+        if self._due.get(user_id) != due:
+            self._due[user_id] = due
+            heapq.heappush(self._heap, (due, user_id))
+            self._wakeup.set()
+
+    def rebalance(self):
+        for user_id in set(self._due) | set(subscribers.ids()):
+            self.reschedule(user_id)
+
+    def next_due(self, user_id: int) -> datetime | None:
+        return self._due.get(int(user_id))
+
+    async def _fire(self, user_id: int):
+        current_user_id.set(user_id)
+        async with self._semaphore:
+            try:
+                if not (s := subscriber(user_id)):
+                    return
+                now = datetime.now(timezone.utc)
+                if (due := refresh_due(s, now, self._attempted.get(user_id))) and (due <= now or refresh_age(s) == float('inf')):
+                    self._attempted[user_id] = now
+                    await asyncio.wait_for(refresh_subscriber(user_id), REMINDER_USER_TIMEOUT)
+                    refresh_stats["refreshes"] += 1
+                    refresh_stats["last_refresh_at"] = datetime.now(timezone.utc)
+                elif (due := bamboo_keepalive_due(s, now, self._touched.get(user_id))) and due <= now:
+                    self._touched[user_id] = now
+                    await asyncio.wait_for(update_bamboo_status(s), REMINDER_USER_TIMEOUT)
+                    refresh_stats["keepalives"] += 1
+                else:
+                    # refreshed on demand (/my_info) since it was scheduled
+                    refresh_stats["skipped"] += 1
+            except TimeoutError:
+                refresh_stats["timeouts"] += 1
+                logger.warning(f"Refreshing integrations for {user_id} timed out after {REMINDER_USER_TIMEOUT}s")
+            finally:
+                self.reschedule(user_id)
+
+    async def run(self):
+        self.rebalance()
+        logger.info(f"Refresh scheduler started with {len(self._due)} subscribers")
+        while True:
+            loop_ticks['refreshes'] = time.monotonic()
+            jira_clients.expire()  # idle clients are closed even when no Jira call comes in
+            now = datetime.now(timezone.utc)
+            while self._heap and self._heap[0][0] <= now:
+                due, user_id = heapq.heappop(self._heap)
+                if self._due.get(user_id) != due:
+                    continue
+                del self._due[user_id]
+                task = asyncio.create_task(self._fire(user_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            self._wakeup.clear()
+            timeout = min((self._heap[0][0] - now).total_seconds(), 60) if self._heap else 60
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
+
+refreshes = RefreshScheduler()
+
+async def worker_loop():
+    """Heartbeat the worker lease and pick up subscribers changed by the other processes, rescheduling what moved"""
+    while True:
+        loop_ticks['worker_loop'] = time.monotonic()
+        try:
+            jira_clients.expire()
+            rebalanced = WORKER_MODE == 'worker' and workers.heartbeat()
+            changed, deleted = subscribers.sync()
+            if rebalanced:
+                reminders.rebalance()
+                refreshes.rebalance()
+            else:
+                for user_id in changed | deleted:
+                    reminders.reschedule(user_id)
+        except Exception as e:
+            logger.exception(f"Error in worker loop: {e}")
+        await asyncio.sleep(WORKER_HEARTBEAT)
+
+class LoopMonitor:
+    """
+    Samples event loop lag every `interval` seconds: how much later than asked a sleep wakes up, i.e. how long the loop
+    was busy with something that did not yield. A watchdog thread notices a loop blocked for longer than `threshold`
+    while it is still blocked and logs the stack of the loop thread, the handler/function in this file it is stuck in
+    and the user id of the running task.
+    """
+    def __init__(self, interval: float = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.1')), threshold: float = float(os.getenv('LOOP_STALL_SECONDS', '0.5'))):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = LatencyHistogram()
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread_id: int | None = None
+
+    def start(self):
+        self._loop, self._thread_id = asyncio.get_running_loop(), threading.get_ident()
+        self._beat = time.monotonic()
+        task = asyncio.create_task(self.run())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        threading.Thread(target=self.watchdog, name='loop-watchdog', daemon=True).start()
+        logger.info(f"Event loop monitor started, stalls over {self.threshold}s are logged")
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat = time.monotonic()
+            lag = max(self._beat - started - self.interval, 0)
+            self.lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                logger.warning(f"loop_stall seconds={lag:.3f}")
+
+    def watchdog(self):
+        reported = None
+        while True:
+            time.sleep(self.interval / 2)
+            beat = self._beat
+            if beat == reported or time.monotonic() - beat < self.threshold + self.interval:
+                continue
+            reported = beat  # once per stall
+            self.stalls += 1
+            if (frame := sys._current_frames().get(self._thread_id)) is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            ours = [f for f in stack if f.filename == __file__]
+            task = asyncio.current_task(self._loop)
+            user_id = task.get_context().get(current_user_id) if task else None
+            logger.warning(
+                f"loop_blocked seconds={time.monotonic() - beat:.3f} function={ours[-1].name if ours else stack[-1].name} "
+                f"handler={next((f.name for f in ours if f.name.endswith('_handler')), None)} task={task.get_name() if task else None} "
+                f"user_id={user_id}\n{''.join(stack.format())}"
+            )
+
+loop_monitor = LoopMonitor() if os.getenv('LOOP_MONITOR', '1') == '1' else None
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9090'))  # 0 disables /metrics and /healthz
+HEALTH_MAX_STALL = float(os.getenv('HEALTH_MAX_STALL', '300'))  # the loops wake up at least every 60s
+started_at = time.monotonic()
+
+def expected_loops() -> list[str]:
+    return {'all': ['reminders', 'refreshes'], 'bot': ['worker_loop'], 'worker': ['reminders', 'refreshes', 'worker_loop']}[WORKER_MODE]
+
+def health() -> tuple[bool, dict]:
+    """Healthy while every loop this process runs iterated within HEALTH_MAX_STALL seconds (or it is still starting up)"""
+    now = time.monotonic()
+    ages = {name: now - loop_ticks[name] if name in loop_ticks else None for name in expected_loops()}
+    healthy = all(age < HEALTH_MAX_STALL if age is not None else now - started_at < HEALTH_MAX_STALL for age in ages.values())
+    return healthy, {'status': 'ok' if healthy else 'stalled', 'worker_mode': WORKER_MODE, 'loop_age_seconds': ages}
+
+def prometheus_histogram(name: str, histogram: LatencyHistogram, labels: str = '') -> list[str]:
+    lines, cumulative = [], 0
+    for le, count in zip([*histogram.buckets, '+Inf'], histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+    labels = f'{{{labels}}}' if labels else ''
+    return lines + [f'{name}_sum{labels} {histogram.seconds_total}', f'{name}_count{labels} {histogram.calls}']
+
+def metrics() -> str:
+    """Everything the bot counts, in the Prometheus text format"""
+    lines = ['# TYPE kc_call_duration_seconds histogram']
+    for name, histogram in sorted(timings.items()):
+        lines += prometheus_histogram('kc_call_duration_seconds', histogram, f'call="{name}"')
+    lines += ['# TYPE kc_call_errors_total counter'] + [f'kc_call_errors_total{{call="{name}"}} {histogram.errors}' for name, histogram in sorted(timings.items())]
+    lines += ['# TYPE kc_reminders_sent_total counter'] + [f'kc_reminders_sent_total{{action="{action}"}} {n}' for action, n in reminder_stats["sent"].items()]
+    lines += ['# TYPE kc_reminder_timeouts_total counter', f'kc_reminder_timeouts_total {reminder_stats["timeouts"]}']
+    lines += ['# TYPE kc_reminder_errors_total counter', f'kc_reminder_errors_total {reminder_stats["errors"]}']
+    lines += ['# TYPE kc_reminder_delay_seconds histogram'] + prometheus_histogram('kc_reminder_delay_seconds', reminder_delay)
+    lines += ['# TYPE kc_refreshes_total counter'] + [f'kc_refreshes_total{{kind="{kind}"}} {refresh_stats[key]}' for kind, key in (('full', 'refreshes'), ('keepalive', 'keepalives'), ('skipped', 'skipped'), ('timeout', 'timeouts'))]
+    if refresh_stats["last_refresh_at"]:
+        lines += ['# TYPE kc_last_refresh_timestamp_seconds gauge', f'kc_last_refresh_timestamp_seconds {refresh_stats["last_refresh_at"].timestamp()}']
+    lines += ['# TYPE kc_scheduled_users gauge', f'kc_scheduled_users{{scheduler="reminders"}} {len(reminders._due)}', f'kc_scheduled_users{{scheduler="refreshes"}} {len(refreshes._due)}']
+    lines += ['# TYPE kc_loop_age_seconds gauge'] + [f'kc_loop_age_seconds{{loop="{name}"}} {time.monotonic() - tick}' for name, tick in loop_ticks.items()]
+    lines += [
+        '# TYPE kc_outbound_queue_depth gauge', f'kc_outbound_queue_depth {outbound.queued()}',
+        '# TYPE kc_outbound_global_queue_depth gauge', f'kc_outbound_global_queue_depth {len(outbound._waiting)}',
+        '# TYPE kc_outbound_requests_total counter', f'kc_outbound_requests_total {outbound.stats["requests"]}',
+        '# TYPE kc_outbound_retry_after_total counter', f'kc_outbound_retry_after_total {outbound.stats["retry_after"]}',
+        '# TYPE kc_jira_executor_queued gauge', f'kc_jira_executor_queued {jira_executor.queued}',
+        '# TYPE kc_jira_executor_running gauge', f'kc_jira_executor_running {jira_executor.running}',
+        '# TYPE kc_jira_executor_timeouts_total counter', f'kc_jira_executor_timeouts_total {jira_executor.stats["timeouts"]}',
+        '# TYPE kc_jira_executor_wait_max_seconds gauge', f'kc_jira_executor_wait_max_seconds {jira_executor.stats["wait_seconds_max"]}',
+        '# TYPE kc_jira_clients gauge', f'kc_jira_clients {len(jira_clients._clients)}',
+        '# TYPE kc_circuit_open gauge', *(f'kc_circuit_open{{host="{host}"}} {int(breaker.is_open)}' for host, breaker in circuits.items()),
+        '# TYPE kc_circuit_failures gauge', *(f'kc_circuit_failures{{host="{host}"}} {breaker.failures}' for host, breaker in circuits.items()),
+    ]
+    lines += ['# TYPE kc_outbound_wait_seconds histogram']
+    for priority, name in ((PRIORITY_INTERACTIVE, 'interactive'), (PRIORITY_REMINDER, 'reminder')):
+        lines += prometheus_histogram('kc_outbound_wait_seconds', outbound.waits[priority], f'priority="{name}"')
+    lines += ['# TYPE kc_jira_executor_wait_seconds histogram'] + prometheus_histogram('kc_jira_executor_wait_seconds', jira_executor.waits)
+    if loop_monitor:
+        lines += ['# TYPE kc_event_loop_lag_seconds histogram'] + prometheus_histogram('kc_event_loop_lag_seconds', loop_monitor.lag)
+        lines += ['# TYPE kc_event_loop_lag_max_seconds gauge', f'kc_event_loop_lag_max_seconds {loop_monitor.max_lag}']
+        lines += ['# TYPE kc_event_loop_stalls_total counter', f'kc_event_loop_stalls_total {loop_monitor.stalls}']
+    if WORKER_MODE == 'worker':
+        lines += ['# TYPE kc_worker_members gauge', f'kc_worker_members {len(workers.members)}', '# TYPE kc_worker_epoch gauge', f'kc_worker_epoch {workers.epoch}']
+    return '\n'.join(lines) + '\n'
+
+async def start_metrics_server() -> web.AppRunner | None:
+    """GET /metrics (Prometheus text format) and /healthz (503 when a loop stalled) on METRICS_HOST:METRICS_PORT"""
+    if not METRICS_PORT:
+        return None
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=metrics(), content_type='text/plain', charset='utf-8')
+    async def handle_health(request: web.Request) -> web.Response:
+        healthy, status = health()
+        return web.json_response(status, status=200 if healthy else 503)
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/healthz', handle_health)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    logger.info(f"Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics, health check on /healthz")
+    return runner
+
+async def on_shutdown(bot: Bot):
+    await bamboo.aclose()
+    jira_executor.shutdown()
+    subscribers.flush()
+
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # polling or webhook
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # public base url, e.g. https://bot.example.com, empty to not register the webhook
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+
+async def on_webhook_startup(bot: Bot):
+    if WEBHOOK_URL:
+        await bot.set_webhook(f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET or None)
+        logger.info(f"Webhook set to {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+async def run_webhook():
+    if not WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET is not set, webhook requests are not verified")
+    dp.startup.register(on_webhook_startup)
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET or None).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info(f"🤖 Bot is listening for webhook updates on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}...")
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+async def run_worker():
+    workers.heartbeat()
+    if loop_monitor:
+        loop_monitor.start()
+    metrics_runner = await start_metrics_server()
+    asyncio.create_task(worker_loop())
+    asyncio.create_task(reminders.run())
+    asyncio.create_task(refreshes.run())
+    logger.info(f"⚙️ Worker {workers.worker_id} is running reminders and refreshes for its shard...")
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        workers.leave()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await on_shutdown(bot)
+        await bot.session.close()
 
 async def main() -> None:
+    if WORKER_MODE == 'worker':
+        await run_worker()
+        return
     dp.startup.register(on_startup)
-    asyncio.create_task(check_reminders_loop())
+    dp.shutdown.register(on_shutdown)
+    if loop_monitor:
+        loop_monitor.start()
+    await start_metrics_server()
+    if WORKER_MODE == 'all':
+        asyncio.create_task(reminders.run())
+        asyncio.create_task(refreshes.run())
+    else:
+        # reminders and refreshes run in the worker processes, keep the cache in step with what they write
+        asyncio.create_task(worker_loop())
+    if BOT_MODE == 'webhook':
+        await run_webhook()
+        return
+    # getUpdates is refused while a webhook is registered
+    await bot.delete_webhook()
     logger.info("🤖 Bot is listening for messages...")
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if sys.argv[1:2] == ['import-json']:
+        # python kc-checkin-bot.py import-json [subscribers_dir]
+        imported = SqliteSubscriberStore(os.getenv('SUBSCRIBER_DB', 'subscribers.sqlite3')).import_json_dir(sys.argv[2] if len(sys.argv) > 2 else 'subscribers')
+        logger.info(f"Imported {imported} subscribers into {os.getenv('SUBSCRIBER_DB', 'subscribers.sqlite3')}")
+    else:
+        asyncio.run(main())
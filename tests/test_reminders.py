@@ -0,0 +1,102 @@
+"""
+Reminder scheduling: next_reminder() across DST transitions and ReminderScheduler retries of failed sends.
+
+    python -m unittest discover tests
+"""
+import asyncio, os, sys, unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from common import load_bot
+
+kc = None
+
+def setUpModule():
+    global kc
+    kc = load_bot(SUBSCRIBER_STORE='json', FSM_STORAGE='memory', WORKER_MODE='all', METRICS_PORT='0', LOOP_MONITOR='0')
+    kc.logger.setLevel('CRITICAL')
+
+def subscriber(user_id: int, schedule: str, tz: str = 'UTC', **fields) -> dict:
+    return {'id': user_id, 'timezone': tz, 'log': {}, 'weekly_schedule': [f"{d},{schedule}" for d in range(1, 8)], **fields}
+
+class NextReminderDstTest(unittest.TestCase):
+    def test_time_in_spring_gap_is_kept_on_its_day(self):
+        # Europe/Warsaw 2026-03-29: 02:00 CET jumps to 03:00 CEST, 02:30 does not exist
+        s = subscriber(1, '02:30,13:00,18:00', 'Europe/Warsaw')
+        action, due = kc.next_reminder(s, datetime(2026, 3, 29, 0, 0, tzinfo=timezone.utc))
+        self.assertEqual((action, due), ('dayin', datetime(2026, 3, 29, 1, 30, tzinfo=timezone.utc)))
+
+    def test_ambiguous_time_in_autumn_fold_fires_once(self):
+        # Europe/Warsaw 2026-10-25: 03:00 CEST falls back to 02:00 CET, 02:30 happens twice; the first one is used
+        s = subscriber(1, '02:30,13:00,18:00', 'Europe/Warsaw')
+        action, due = kc.next_reminder(s, datetime(2026, 10, 24, 22, 0, tzinfo=timezone.utc))
+        self.assertEqual((action, due), ('dayin', datetime(2026, 10, 25, 0, 30, tzinfo=timezone.utc)))
+        # reminded at the first 02:30, what follows is the regular repeat and not a second reminder at the second 02:30
+        s['last_reminder'] = {'id': 1, 'action': 'dayin', 'sent_at': due.isoformat(), 'count': 1}
+        self.assertEqual(kc.next_reminder(s, due)[1], due + timedelta(seconds=kc.REMINDER_INTERVAL))
+
+    def test_wall_clock_time_after_transition(self):
+        # scheduled from before the transition, the day after it still fires at 09:00 local time
+        s = subscriber(1, '09:00,13:00,18:00', 'Europe/Warsaw')
+        s['weekly_schedule'] = ['1,09:00,13:00,18:00']
+        action, due = kc.next_reminder(s, datetime(2026, 10, 23, 12, 0, tzinfo=timezone.utc))
+        self.assertEqual((action, due), ('dayin', datetime(2026, 10, 26, 8, 0, tzinfo=timezone.utc)))
+
+class ReminderRetryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sends = []
+        self.send_message, self.timeout = kc.bot.send_message, kc.REMINDER_USER_TIMEOUT
+        kc.reminders = kc.ReminderScheduler()
+        # due right away: the day started at midnight and nothing is logged (UTC, so it is today whenever this runs)
+        kc.save_subscriber(subscriber(self.user_id, '00:00,23:58,23:59'))
+        kc.subscribers.flush()
+
+    async def asyncTearDown(self):
+        kc.bot.send_message, kc.REMINDER_USER_TIMEOUT = self.send_message, self.timeout
+        kc.delete_subscriber(self.user_id)
+
+    user_id = 1001
+
+    async def run_scheduler(self, seconds: float):
+        task = asyncio.create_task(kc.reminders.run())
+        await asyncio.sleep(seconds)
+        task.cancel()
+        await asyncio.gather(task, *kc.reminders._tasks, return_exceptions=True)
+
+    async def test_failed_send_is_retried_after_the_interval(self):
+        async def send_message(chat_id, text, **kwargs):
+            self.sends.append(datetime.now(timezone.utc))
+            raise RuntimeError('chat not found')
+        kc.bot.send_message = send_message
+        await self.run_scheduler(1)
+        self.assertEqual(len(self.sends), 1)
+        self.assertNotIn('last_reminder', kc.subscriber(self.user_id))
+        self.assertGreaterEqual(kc.reminders.next_due(self.user_id), self.sends[0] + timedelta(seconds=kc.REMINDER_INTERVAL - 1))
+
+    async def test_timed_out_send_is_not_repeated_nor_rescheduled_while_running(self):
+        async def send_message(chat_id, text, **kwargs):
+            self.sends.append(datetime.now(timezone.utc))
+            kc.reminders.reschedule(chat_id)  # e.g. the user pressed a button meanwhile
+            self.assertIsNone(kc.reminders.next_due(chat_id))
+            await asyncio.sleep(10)
+        kc.bot.send_message, kc.REMINDER_USER_TIMEOUT = send_message, 0.2
+        await self.run_scheduler(1)
+        self.assertEqual(len(self.sends), 1)
+        self.assertGreaterEqual(kc.reminders.next_due(self.user_id), self.sends[0] + timedelta(seconds=kc.REMINDER_INTERVAL - 1))
+
+    async def test_next_action_is_not_held_back_by_the_failed_one(self):
+        async def send_message(chat_id, text, **kwargs):
+            self.sends.append(datetime.now(timezone.utc))
+            raise RuntimeError('chat not found')
+        kc.bot.send_message = send_message
+        await self.run_scheduler(0.5)
+        s = kc.subscriber(self.user_id)
+        # clocked in meanwhile, lunch out is due right away as well
+        s['log'] = {'dayin': datetime.now(timezone.utc).isoformat()}
+        s['weekly_schedule'] = [f"{d},00:00,00:00,23:59" for d in range(1, 8)]
+        kc.save_subscriber(s)
+        kc.reminders.reschedule(self.user_id)
+        self.assertLessEqual(kc.reminders.next_due(self.user_id), datetime.now(timezone.utc))
+
+if __name__ == '__main__':
+    unittest.main()